@@ -14,6 +14,14 @@ setup(name='tap-freshdesk',
           'requests==2.31.0',
           'backoff==1.3.2'
       ],
+      extras_require={
+          'asyncio': [
+              'aiohttp==3.9.5',
+          ],
+          'orjson': [
+              'orjson==3.9.15',
+          ],
+      },
       entry_points='''
           [console_scripts]
           tap-freshdesk=tap_freshdesk:main
@@ -1,6 +1,14 @@
 #!/usr/bin/env python3
 
+import concurrent.futures
+import copy
+import datetime
+import functools
+import itertools
+import queue
+import signal
 import sys
+import threading
 import time
 
 import backoff
@@ -8,14 +16,42 @@ import requests
 from requests.exceptions import HTTPError
 import singer
 
-from tap_freshdesk import utils
+from tap_freshdesk import aio, discover, utils
+from tap_freshdesk.metrics import Metrics
+from tap_freshdesk.transform import SchemaRegistry
+from tap_freshdesk.transport import CONNECT_TIMEOUT, READ_TIMEOUT, Transport, TransportOptions, format_stats
+from tap_freshdesk.writer import MessageWriter
 
 
 REQUIRED_CONFIG_KEYS = ['api_key', 'domain', 'start_date']
 PER_PAGE = 100
+# Ticket stats that move whenever a reply is added to the ticket
+CONVERSATION_STATS = ['agent_responded_at', 'requester_responded_at', 'first_responded_at']
+SUB_TICKET_WORKERS = 4
+STREAM_WORKERS = 1
+# Pages read from one _updated_since listing before the contacts sync starts
+# a new window from the newest contact it has seen
+CONTACTS_WINDOW_PAGES = 100
+# Ticket listings are not paged past this page number
+TICKET_MAX_PAGES = 300
+# Pages each ticket window should take in the windowed ticket sync
+TICKET_WINDOW_PAGES = 50
+TICKET_WINDOW_MIN_SECONDS = 60
+# The search API pages 30 results at a time and stops after 10 pages
+SEARCH_MAX_RESULTS = 300
+# Days before the bookmark the account time entries listing is read from,
+# as time can be logged after the last sync for work done before it
+TIME_ENTRIES_LOOKBACK_DAYS = 30
+# Hours before a feature found to be off on the account is asked for again
+FEATURE_CHECK_HOURS = 24
+# Order in which requests waiting on the rate limiter are sent
+PRIORITY_TICKETS = 0
+PRIORITY_TICKET_CHILDREN = 1
+PRIORITY_STREAMS = 2
 BASE_URL = "https://{}.freshdesk.com"
 CONFIG = {}
 STATE = {}
+STOP_SIGNAL = {}
 
 endpoints = {
     "tickets": "/api/v2/tickets",
@@ -25,59 +61,245 @@ endpoints = {
     "groups": "/api/v2/groups",
     "companies": "/api/v2/companies",
     "contacts": "/api/v2/contacts",
+    "satisfaction_ratings": "/api/v2/surveys/satisfaction_ratings",
+    "time_entries": "/api/v2/time_entries",
+    "search": "/api/v2/search/{entity}",
+}
+
+# Listing parameters that filter on updated_at on the server
+updated_since_params = {
+    "contacts": "_updated_since",
+}
+
+# Search API queries that return the rows updated on or after a date
+search_queries = {
+    "companies": "updated_at:>'{}'",
 }
 
 logger = singer.get_logger()
-session = requests.Session()
+rate_limiter = utils.RateLimiter()
+budget = utils.CallBudget()
+# Tickets processed so far in the run
+ticket_index = utils.TicketIndex()
+# {entity: whether the account-wide listing answered 403} for this run
+feature_checks = {}
+feature_lock = threading.Lock()
+# The http engine every request is sent through, opened on first use
+transport = None
+transport_lock = threading.Lock()
+writer = MessageWriter()
+schemas = SchemaRegistry()
+metrics = Metrics()
+# Guards STATE, which streams synced concurrently update from their own threads
+state_lock = threading.RLock()
+# Set when the tap is asked to stop; every thread stops at its next request
+stop_event = threading.Event()
+# Set when a stream failed while others ran alongside it; they stop at their
+# next request so the error is reported without waiting for them to finish
+cancel_event = threading.Event()
+
+
+class SyncInterrupted(Exception):
+    def __init__(self, signum):
+        super().__init__("Sync interrupted by signal {}".format(signum))
+        self.signum = signum
+
+
+class BudgetExhausted(Exception):
+    def __init__(self, limit):
+        super().__init__("Spent the budget of {} API requests".format(limit))
+
+
+class SyncCancelled(Exception):
+    def __init__(self):
+        super().__init__("Sync cancelled because another stream failed")
 
 
 def get_url(endpoint, **kwargs):
-    return BASE_URL.format(CONFIG['domain']) + endpoints[endpoint].format(**kwargs)
+    return CONFIG.get('base_url', BASE_URL).format(CONFIG['domain']) + endpoints[endpoint].format(**kwargs)
+
+
+def record_retry(details):
+    metrics.retry(details['args'][0], details['wait'])
 
 
 @backoff.on_exception(backoff.expo,
                       (requests.exceptions.RequestException),
                       max_tries=5,
                       giveup=lambda e: e.response is not None and 400 <= e.response.status_code < 500,
+                      on_backoff=record_retry,
                       factor=2)
-@utils.ratelimit(1, 2)
-def request(url, params=None):
+def request(url, params=None, priority=PRIORITY_STREAMS):
     params = params or {}
     headers = {}
     if 'user_agent' in CONFIG:
         headers['User-Agent'] = CONFIG['user_agent']
 
     req = requests.Request('GET', url, params=params, auth=(CONFIG['api_key'], ""), headers=headers).prepare()
-    logger.info("GET {}".format(req.url))
-    resp = session.send(req)
+    while True:
+        if not budget.spend():
+            raise BudgetExhausted(budget.limit)
+        waited = rate_limiter.acquire(priority, (stop_event, cancel_event))
+        if waited is None:
+            if stop_event.is_set():
+                raise SyncInterrupted(STOP_SIGNAL.get('signum'))
+            raise SyncCancelled()
+        metrics.wait(waited)
+        logger.info("GET {}".format(req.url))
+        start = time.monotonic()
+        try:
+            resp = get_transport().send(req)
+        except requests.exceptions.RequestException:
+            metrics.request(url, time.monotonic() - start, "error")
+            raise
+        metrics.request(url, time.monotonic() - start, resp.status_code)
 
-    if 'Retry-After' in resp.headers:
-        retry_after = int(resp.headers['Retry-After'])
+        # The limiter holds back every caller until Retry-After has elapsed,
+        # so the request is simply retried once a token is available again.
+        retry_after = rate_limiter.update(resp.headers)
+        if retry_after is None:
+            break
+        metrics.rate_limit(url)
         logger.info("Rate limit reached. Sleeping for {} seconds".format(retry_after))
-        time.sleep(retry_after)
-        return request(url, params)
 
     resp.raise_for_status()
 
     return resp
 
 
+def get_pool_size():
+    """Return the number of connections needed for every thread that can be
+    making a request at the same time."""
+    if 'http_pool_size' in CONFIG:
+        return int(CONFIG['http_pool_size'])
+    per_stream = (int(CONFIG.get('sub_ticket_workers', SUB_TICKET_WORKERS))
+                  + int(CONFIG.get('ticket_window_workers', 1))
+                  + (1 if int(CONFIG.get('prefetch_pages', 0)) > 0 else 0))
+    return int(CONFIG.get('stream_workers', STREAM_WORKERS)) * per_stream
+
+
+def open_transport():
+    options = TransportOptions(get_pool_size(),
+                               connect_timeout=float(CONFIG.get('connect_timeout', CONNECT_TIMEOUT)),
+                               read_timeout=float(CONFIG.get('request_timeout', READ_TIMEOUT)),
+                               keep_alive=CONFIG.get('http_keep_alive', True),
+                               compression=CONFIG.get('http_compression', True))
+    engine = CONFIG.get('http_engine', 'requests')
+    logger.info("Using the {} http engine with {} connections per host".format(engine, options.pool_size))
+    if engine == 'asyncio':
+        return aio.AsyncEngine(options)
+    return Transport(options)
+
+
+def get_transport():
+    global transport
+    with transport_lock:
+        if transport is None:
+            transport = open_transport()
+        return transport
+
+
+def close_transport():
+    global transport
+    with transport_lock:
+        if transport is None:
+            return
+        for line in format_stats(transport.stats()):
+            logger.info("Connection reuse: {}".format(line))
+        transport.close()
+        transport = None
+
+
 def get_start(entity):
-    if entity not in STATE:
-        STATE[entity] = CONFIG['start_date']
+    with state_lock:
+        if entity not in STATE:
+            STATE[entity] = CONFIG['start_date']
 
-    return STATE[entity]
+        return STATE[entity]
 
 
-def gen_request(url, params=None):
-    params = params or {}
-    params["per_page"] = PER_PAGE
+def update_state(entity, dt):
+    with state_lock:
+        utils.update_state(STATE, entity, dt)
+
+
+def write_state():
+    # Records are always handed to the writer before their bookmark is
+    # updated, so a snapshot taken now never covers unwritten records.
+    with state_lock:
+        writer.write_state(copy.deepcopy(STATE))
+
+
+def get_checkpointer():
+    every_seconds = float(CONFIG.get('checkpoint_seconds', 0))
+    on_page = CONFIG.get('checkpoint_pages', False)
+    # Checkpoint every record unless another trigger was asked for
+    default_records = 0 if every_seconds or on_page else 1
+    return utils.Checkpointer(write_state,
+                              every_records=int(CONFIG.get('checkpoint_records', default_records)),
+                              every_seconds=every_seconds,
+                              on_page=on_page)
+
+
+def is_feature_available(entity):
+    """Return False while `entity` is remembered as unavailable on the
+    account, for up to feature_check_hours after it was found to be."""
+    with state_lock:
+        checked_at = STATE.get('unavailable_features', {}).get(entity)
+    if checked_at is None:
+        return True
+    ttl = float(CONFIG.get('feature_check_hours', FEATURE_CHECK_HOURS)) * 3600
+    return (singer.utils.now() - singer.utils.strptime_to_utc(checked_at)).total_seconds() >= ttl
+
+
+def set_feature_available(entity, available):
+    """Remember in STATE whether `entity` is available on the account.
+    Returns True when that changes what was remembered."""
+    with state_lock:
+        features = STATE.get('unavailable_features', {})
+        if available:
+            changed = features.pop(entity, None) is not None
+        else:
+            changed = is_feature_available(entity)
+            if changed:
+                features[entity] = utils.strftime(singer.utils.now())
+        if features:
+            STATE['unavailable_features'] = features
+        else:
+            STATE.pop('unavailable_features', None)
+        return changed
+
+
+def is_feature_off(entity):
+    """Tell whether a 403 on one ticket's `entity` means the feature is off
+    on the account, rather than that the ticket can't be seen, by asking
+    the account-wide listing. It is only asked once per run."""
+    with feature_lock:
+        if entity not in feature_checks:
+            try:
+                request(get_url(entity), {'per_page': 1}, PRIORITY_TICKET_CHILDREN)
+                feature_checks[entity] = False
+            except HTTPError as e:
+                if e.response.status_code != 403:
+                    raise
+                feature_checks[entity] = True
+        return feature_checks[entity]
+
+
+def write_schema(entity, bookmark_property='updated_at'):
+    writer.write_schema(entity,
+                        schemas.get_selected_schema(entity),
+                        ["id"],
+                        bookmark_properties=[bookmark_property])
+
+
+def gen_pages(url, params, priority):
     page = 1
     while True:
         params['page'] = page
-        data = request(url, params).json()
-        for row in data:
-            yield row
+        data = request(url, params, priority).json()
+        metrics.page(url)
+        yield data
 
         if len(data) == PER_PAGE:
             page += 1
@@ -85,43 +307,64 @@ def gen_request(url, params=None):
             break
 
 
-def transform_dict(d, key_key="name", value_key="value", force_str=False):
-    # Custom fields are expected to be strings, but sometimes the API sends
-    # booleans. We cast those to strings to match the schema.
-    rtn = []
-    for k, v in d.items():
-        if force_str:
-            v = str(v).lower()
-        rtn.append({key_key: k, value_key: v})
-    return rtn
+def gen_request(url, params=None, prefetch=False, priority=PRIORITY_STREAMS):
+    params = params or {}
+    params["per_page"] = PER_PAGE
+    pages = gen_pages(url, params, priority)
 
+    # Listings can fetch the next pages in the background while the rows of
+    # the current one are processed. Requests still go through request() and
+    # so through the shared rate limiter.
+    depth = int(CONFIG.get('prefetch_pages', 0))
+    if prefetch and depth > 0:
+        pages = utils.prefetch(pages, depth)
 
-def sync_tickets():
-    bookmark_property = 'updated_at'
+    for data in pages:
+        for row in data:
+            yield row
 
-    singer.write_schema("tickets",
-                        utils.load_schema("tickets"),
-                        ["id"],
-                        bookmark_properties=[bookmark_property])
 
-    singer.write_schema("conversations",
-                        utils.load_schema("conversations"),
-                        ["id"],
-                        bookmark_properties=[bookmark_property])
+def search(entity, query):
+    """Return every search result for `query`, or None when more rows match
+    than the search API is able to page through."""
+    url = get_url("search", entity=entity)
+    rows = []
+    page = 1
+    while True:
+        data = request(url, {'query': '"{}"'.format(query), 'page': page}).json()
+        metrics.page(url)
+        if data['total'] > SEARCH_MAX_RESULTS:
+            return None
 
-    singer.write_schema("satisfaction_ratings",
-                        utils.load_schema("satisfaction_ratings"),
-                        ["id"],
-                        bookmark_properties=[bookmark_property])
+        rows.extend(data['results'])
+        if not data['results'] or len(rows) >= data['total']:
+            return rows
+        page += 1
 
-    singer.write_schema("time_entries",
-                        utils.load_schema("time_entries"),
-                        ["id"],
-                        bookmark_properties=[bookmark_property])
 
-    sync_tickets_by_filter(bookmark_property)
-    sync_tickets_by_filter(bookmark_property, "deleted")
-    sync_tickets_by_filter(bookmark_property, "spam")
+def get_ticket_children():
+    """Return the selected streams that are fetched once per ticket."""
+    children = ["conversations"]
+    if not CONFIG.get('account_time_entries'):
+        children.append("time_entries")
+    return [entity for entity in children if schemas.is_selected(entity)]
+
+
+def get_ticket_includes():
+    # Embedding requester, company and stats makes every ticket page larger,
+    # so only the ones that are selected or needed are asked for
+    includes = [include for include in ["requester", "company", "stats"]
+                if schemas.is_selected("tickets", include)]
+    if ("stats" not in includes and CONFIG.get('skip_conversations_by_stats')
+            and schemas.is_selected("conversations")):
+        includes.append("stats")
+    return includes
+
+
+def write_ticket_schemas():
+    for entity in ["tickets"] + get_ticket_children():
+        if schemas.is_selected(entity):
+            write_schema(entity)
 
 
 def sync_tickets_by_filter(bookmark_property, predefined_filter=None):
@@ -137,8 +380,10 @@ def sync_tickets_by_filter(bookmark_property, predefined_filter=None):
         'updated_since': start,
         'order_by': bookmark_property,
         'order_type': "asc",
-        'include': "requester,company,stats"
     }
+    includes = get_ticket_includes()
+    if includes:
+        params['include'] = ",".join(includes)
 
     if predefined_filter:
         logger.info("Syncing tickets with filter {}".format(predefined_filter))
@@ -146,104 +391,684 @@ def sync_tickets_by_filter(bookmark_property, predefined_filter=None):
     if predefined_filter:
         params['filter'] = predefined_filter
 
-    for i, row in enumerate(gen_request(get_url(endpoint), params)):
-        logger.info("Ticket {}: Syncing".format(row['id']))
-        row.pop('attachments', None)
-        row['custom_fields'] = transform_dict(row['custom_fields'], force_str=True)
+    workers = int(CONFIG.get('sub_ticket_workers', SUB_TICKET_WORKERS))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        if CONFIG.get('ticket_window_days'):
+            sync_ticket_windows(executor, state_entity, params, bookmark_property, start)
+            return
+
+        # The listing restarts at the bookmark, so the tickets written at
+        # exactly that updated_at are recorded to avoid syncing them again.
+        # Children are filtered against the bookmark the filter started
+        # from, as tickets not reached yet can have children older than the
+        # bookmark it has moved to since.
+        with state_lock:
+            progress = STATE.setdefault('tickets_progress', {}).setdefault(
+                state_entity, {'since': start, 'updated_at': start, 'ids': []})
+        done_ids = set(progress['ids']) if progress['updated_at'] == start else set()
+        since = progress.get('since', start)
+
+        with get_checkpointer() as checkpointer:
+            listing = gen_request(get_url(endpoint), params, prefetch=True, priority=PRIORITY_TICKETS)
+            for rows in utils.batch(listing, PER_PAGE):
+                rows = [row for row in rows
+                        if row[bookmark_property] != start or row['id'] not in done_ids]
+                for row, sub_records in sync_ticket_page(executor, rows, bookmark_property, since):
+                    write_ticket(row, sub_records)
+                    with state_lock:
+                        if row[bookmark_property] != progress['updated_at']:
+                            progress['updated_at'] = row[bookmark_property]
+                            progress['ids'] = []
+                        progress['ids'].append(row['id'])
+                        update_state(state_entity, row[bookmark_property])
+                    checkpointer.record()
+                checkpointer.page()
+
+            with state_lock:
+                STATE['tickets_progress'].pop(state_entity, None)
+                if not STATE['tickets_progress']:
+                    STATE.pop('tickets_progress')
+
+
+def sync_filtered_tickets(predefined_filter):
+    """Sync the deleted or spam tickets, skipping the scan when the last one
+    started less than `deleted_spam_scan_minutes` ago. Their bookmark is
+    kept, so a skipped scan only delays the tickets to the next one."""
+    state_entity = "tickets_" + predefined_filter
+    interval = float(CONFIG.get('deleted_spam_scan_minutes', 0)) * 60
+    now = singer.utils.now().replace(microsecond=0)
+    if interval:
+        with state_lock:
+            scanned_at = STATE.get('tickets_scanned_at', {}).get(state_entity)
+        if scanned_at and (now - singer.utils.strptime_to_utc(scanned_at)).total_seconds() < interval:
+            logger.info("Skipping tickets with filter {}, last scanned at {}".format(predefined_filter, scanned_at))
+            return
+
+    sync_tickets_by_filter('updated_at', predefined_filter)
+
+    if interval:
+        with state_lock:
+            STATE.setdefault('tickets_scanned_at', {})[state_entity] = utils.strftime(now)
+        write_state()
+
+
+def sync_ticket_page(executor, rows, bookmark_property, since):
+    # A ticket updated while the listings are paged shows up again on a
+    # later page, and filters can overlap; a version that was already
+    # processed in this run is not fetched or written again.
+    rows = [row for row in rows if ticket_index.claim(row['id'], row[bookmark_property])]
+
+    # Sub-entities for a page of tickets are fetched concurrently, but
+    # executor.map hands results back in ticket order so records and
+    # bookmarks are emitted exactly as a serial sync would emit them.
+    children = executor.map(lambda row: sync_ticket_children(row, bookmark_property, since), rows)
+    return zip(rows, children)
+
+
+def write_ticket(row, sub_records):
+    for sub_entity, subrows in sub_records:
+        for subrow in subrows:
+            writer.write_record(sub_entity, subrow)
+        metrics.record(sub_entity, len(subrows))
+
+    if schemas.is_selected("tickets"):
+        writer.write_record("tickets", schemas.get_transformer("tickets").transform(row))
+        metrics.record("tickets")
+
+
+class WindowSizer:
+    """Sizes ticket windows so each one takes about TICKET_WINDOW_PAGES pages,
+    based on the page counts of the windows completed so far."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def observe(self, seconds, pages):
+        target = seconds * TICKET_WINDOW_PAGES / max(pages, 1)
+        # Grow at most 4x per window so one sparse window doesn't make the
+        # next one span years of busy history.
+        self.seconds = min(max(target, TICKET_WINDOW_MIN_SECONDS), seconds * 4)
+
+
+def plan_ticket_windows(gaps, sizer):
+    for since, until in gaps:
+        cursor = since
+        while cursor < until:
+            end = min(cursor + datetime.timedelta(seconds=sizer.seconds), until)
+            yield cursor, end
+            cursor = end
+
+
+def get_window_gaps(since, until, completed):
+    """Return the parts of [since, until) not covered by completed windows."""
+    gaps = []
+    cursor = since
+    for start, end, _ in sorted(completed):
+        start, end = singer.utils.strptime_to_utc(start), singer.utils.strptime_to_utc(end)
+        if start > cursor:
+            gaps.append((cursor, min(start, until)))
+        cursor = max(cursor, end)
+    if cursor < until:
+        gaps.append((cursor, until))
+    return gaps
+
+
+def get_completed_bookmark(since, completed):
+    """Return the newest updated_at among the windows that cover [since, ...)
+    without a gap, or None if the first window has not completed yet."""
+    bookmark = None
+    cursor = since
+    for start, end, max_updated in sorted(completed):
+        if start > cursor:
+            break
+        cursor = max(cursor, end)
+        if max_updated and (bookmark is None or max_updated > bookmark):
+            bookmark = max_updated
+    return bookmark
+
+
+def sync_ticket_windows(executor, state_entity, params, bookmark_property, start):
+    """Sync tickets by splitting [bookmark, now) into time windows that are
+    paged independently and, with ticket_window_workers > 1, concurrently.
 
-        # get all sub-entities and save them
-        logger.info("Ticket {}: Syncing conversations".format(row['id']))
+    Completed windows are recorded in STATE['ticket_windows'] so a resumed
+    sync only fetches the gaps between them, along with the ids already
+    written at the newest updated_at of each window still running, which a
+    resumed sync skips. The filter's bookmark only moves over windows that
+    completed without a gap before them. Children are filtered against the
+    `since` the windows were planned from.
+    """
+    with state_lock:
+        window_state = STATE.setdefault('ticket_windows', {}).setdefault(
+            state_entity, {'since': utils.strftime(singer.utils.strptime_to_utc(start)), 'completed': []})
+    since = window_state['since']
+    completed = window_state['completed']
+    written = window_state.setdefault('ids', {})
+    done = {(updated_at, ticket_id) for updated_at, ids in written.items() for ticket_id in ids}
+    gaps = get_window_gaps(singer.utils.strptime_to_utc(since),
+                           singer.utils.now().replace(microsecond=0),
+                           completed)
 
+    sizer = WindowSizer(float(CONFIG['ticket_window_days']) * 86400)
+    windows = plan_ticket_windows(gaps, sizer)
+    workers = int(CONFIG.get('ticket_window_workers', 1))
+
+    results = queue.Queue(maxsize=workers * 2)
+    stop = threading.Event()
+
+    def emit(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        # The sync has failed elsewhere, stop paging this window
+        raise concurrent.futures.CancelledError()
+
+    def run_window(window):
         try:
-            for subrow in gen_request(get_url("sub_ticket", id=row['id'], entity="conversations")):
-                subrow.pop("attachments", None)
-                subrow.pop("body", None)
-                if subrow[bookmark_property] >= start:
-                    singer.write_record("conversations", subrow, time_extracted=singer.utils.now())
-        except HTTPError as e:
-            if e.response.status_code == 403:
-                logger.info('Invalid ticket ID requested from Freshdesk {0}'.format(row['id']))
-            else:
-                raise
+            pages, max_updated = sync_ticket_window(
+                executor, window, params, bookmark_property, since, done,
+                lambda kind, payload=None: emit((kind, window, payload)))
+            emit(('done', window, (pages, max_updated)))
+        except Exception as e:
+            if not stop.is_set():
+                emit(('error', window, e))
+
+    # Windows still running are recorded as completed up to their newest
+    # ticket, so an interrupted window resumes from there, skipping the
+    # tickets in `written` it already wrote at that updated_at
+    in_progress = {}
 
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as window_executor, \
+            get_checkpointer() as checkpointer:
         try:
-            logger.info("Ticket {}: Syncing satisfaction ratings".format(row['id']))
-            for subrow in gen_request(get_url("sub_ticket", id=row['id'], entity="satisfaction_ratings")):
-                subrow['ratings'] = transform_dict(subrow['ratings'], key_key="question")
-                if subrow[bookmark_property] >= start:
-                    singer.write_record("satisfaction_ratings", subrow, time_extracted=singer.utils.now())
+            running = 0
+            for window in itertools.islice(windows, workers):
+                window_executor.submit(run_window, window)
+                running += 1
+
+            while running:
+                kind, window, payload = results.get()
+                if kind == 'error':
+                    raise payload
+
+                if kind == 'ticket':
+                    row, sub_records = payload
+                    write_ticket(row, sub_records)
+
+                    last_updated = row[bookmark_property]
+                    with state_lock:
+                        if window not in in_progress:
+                            in_progress[window] = [utils.strftime(window[0]), None, None]
+                            completed.append(in_progress[window])
+                        if in_progress[window][1] != last_updated:
+                            written.pop(in_progress[window][1], None)
+                            in_progress[window][1:] = [last_updated, last_updated]
+                        written.setdefault(last_updated, []).append(row['id'])
+                        update_state(state_entity, get_completed_bookmark(since, completed))
+                    checkpointer.record()
+                    continue
+
+                if kind == 'page':
+                    checkpointer.page()
+                    continue
+
+                running -= 1
+                pages, max_updated = payload
+                window_since, window_until = window
+                logger.info("Tickets window {} - {} completed in {} pages".format(
+                    utils.strftime(window_since), utils.strftime(window_until), pages))
+                sizer.observe((window_until - window_since).total_seconds(), pages)
+
+                with state_lock:
+                    entry = in_progress.pop(window, None)
+                    if entry is None:
+                        entry = []
+                        completed.append(entry)
+                    entry[:] = [utils.strftime(window_since), utils.strftime(window_until), max_updated]
+                    for updated_at in list(written):
+                        if entry[0] <= updated_at < entry[1]:
+                            del written[updated_at]
+                    update_state(state_entity, get_completed_bookmark(since, completed))
+                checkpointer.checkpoint()
+
+                for window in itertools.islice(windows, 1):
+                    window_executor.submit(run_window, window)
+                    running += 1
+        finally:
+            stop.set()
+
+        with state_lock:
+            STATE['ticket_windows'].pop(state_entity, None)
+            if not STATE['ticket_windows']:
+                STATE.pop('ticket_windows')
+
+
+def sync_ticket_window(executor, window, params, bookmark_property, since, done, emit):
+    """Page through the tickets updated within `window`. Tickets are listed
+    in updated_at order, so paging stops at the first ticket past the end of
+    the window, and a window deeper than TICKET_MAX_PAGES is continued from
+    the last ticket seen. Tickets whose (updated_at, id) is in `done` were
+    written by an earlier run and are skipped. Each ticket is handed to
+    `emit` as soon as its children are fetched, followed by the end of its
+    page. Returns the number of pages read and the newest updated_at in the
+    window."""
+    window_since, window_until = window
+    until = utils.strftime(window_until)
+    updated_since = utils.strftime(window_since)
+    url = get_url("tickets")
+    pages = 0
+    max_updated = None
+
+    while True:
+        window_params = dict(params, updated_since=updated_since, per_page=PER_PAGE)
+        for page in range(1, TICKET_MAX_PAGES + 1):
+            window_params['page'] = page
+            data = request(url, window_params, PRIORITY_TICKETS).json()
+            metrics.page(url)
+            pages += 1
+
+            rows = [row for row in data if row[bookmark_property] < until]
+            if rows:
+                new_rows = [row for row in rows if (row[bookmark_property], row['id']) not in done]
+                for item in sync_ticket_page(executor, new_rows, bookmark_property, since):
+                    emit('ticket', item)
+                emit('page')
+                max_updated = rows[-1][bookmark_property]
+
+            if len(rows) < PER_PAGE:
+                return pages, max_updated
+
+        if max_updated is None or max_updated <= updated_since:
+            # Continuing from the same updated_at would read the same pages
+            # again, and the listing cannot be paged any further
+            raise Exception("More than {} tickets were updated at {}, which the tickets listing "
+                            "cannot page through".format(TICKET_MAX_PAGES * PER_PAGE, updated_since))
+        logger.info("Reached page {} of the tickets listing, continuing from {}".format(
+            TICKET_MAX_PAGES, max_updated))
+        updated_since = max_updated
+
+
+def has_new_conversations(ticket, start):
+    """Use the ticket stats to tell whether any conversation on the ticket
+    could have been created since `start`. Tickets without stats are always
+    assumed to have new conversations."""
+    if ticket['created_at'] >= start:
+        return True
+
+    stats = ticket.get('stats')
+    if not stats:
+        return True
+
+    return any(stats.get(key) and stats[key] >= start for key in CONVERSATION_STATS)
+
+
+def sync_ticket_children(ticket, bookmark_property, start):
+    """Fetch the conversations and time entries of a ticket. Returns
+    (entity, rows) pairs in the order they should be written."""
+    ticket_id = ticket['id']
+    logger.info("Ticket {}: Syncing".format(ticket_id))
+    children = get_ticket_children()
+    conversations = []
+    time_entries = []
+
+    if "conversations" not in children:
+        pass
+    elif CONFIG.get('skip_conversations_by_stats') and not has_new_conversations(ticket, start):
+        logger.info("Ticket {}: No new replies since {}, skipping conversations".format(ticket_id, start))
+    else:
+        # The listing returns up to PER_PAGE conversations in one call. Viewing
+        # the ticket with include=conversations is never cheaper: it returns
+        # at most 10 of them and the include costs an extra API credit.
+        logger.info("Ticket {}: Syncing conversations".format(ticket_id))
+        try:
+            url = get_url("sub_ticket", id=ticket_id, entity="conversations")
+            conversations = [subrow for subrow in gen_request(url, priority=PRIORITY_TICKET_CHILDREN)
+                             if subrow[bookmark_property] >= start]
         except HTTPError as e:
             if e.response.status_code == 403:
-                logger.info("The Surveys feature is unavailable. Skipping the satisfaction_ratings stream.")
+                logger.info('Invalid ticket ID requested from Freshdesk {0}'.format(ticket_id))
             else:
                 raise
 
+    if "time_entries" not in children or not is_feature_available("time_entries"):
+        pass
+    elif ticket.get('deleted') or ticket.get('spam'):
+        # The time entries of deleted and spam tickets are never found
+        logger.info("Ticket {}: Deleted or spam, skipping time entries".format(ticket_id))
+    else:
         try:
-            logger.info("Ticket {}: Syncing time entries".format(row['id']))
-            for subrow in gen_request(get_url("sub_ticket", id=row['id'], entity="time_entries")):
+            logger.info("Ticket {}: Syncing time entries".format(ticket_id))
+            url = get_url("sub_ticket", id=ticket_id, entity="time_entries")
+            for subrow in gen_request(url, priority=PRIORITY_TICKET_CHILDREN):
                 if subrow[bookmark_property] >= start:
-                    singer.write_record("time_entries", subrow, time_extracted=singer.utils.now())
+                    time_entries.append(subrow)
+            set_feature_available("time_entries", True)
 
         except HTTPError as e:
             if e.response.status_code == 403:
-                logger.info("The Timesheets feature is unavailable. Skipping the time_entries stream.")
+                if not is_feature_off("time_entries"):
+                    logger.info("Could not retrieve time entries for ticket id {}. The API key may not have "
+                                "access to the ticket.".format(ticket_id))
+                elif set_feature_available("time_entries", False):
+                    logger.info("The Timesheets feature is unavailable. Skipping time entries for {} hours.".format(
+                        CONFIG.get('feature_check_hours', FEATURE_CHECK_HOURS)))
             elif e.response.status_code == 404:
                 # 404 is being returned for deleted tickets and spam
                 logger.info("Could not retrieve time entries for ticket id {}. This may be caused by tickets "
-                            "marked as spam or deleted.".format(row['id']))
+                            "marked as spam or deleted.".format(ticket_id))
             else:
                 raise
 
-        utils.update_state(STATE, state_entity, row[bookmark_property])
-        singer.write_record(endpoint, row, time_extracted=singer.utils.now())
-        singer.write_state(STATE)
+    return [(entity, schemas.get_transformer(entity).transform_page(rows))
+            for entity, rows in [("conversations", conversations), ("time_entries", time_entries)]
+            if entity in children]
+
+
+def sync_satisfaction_ratings():
+    entity = "satisfaction_ratings"
+    bookmark_property = 'updated_at'
+
+    write_schema(entity, bookmark_property)
+    transformer = schemas.get_transformer(entity)
+    start = get_start(entity)
+
+    if not is_feature_available(entity):
+        logger.info("The Surveys feature was unavailable when last checked. Skipping the {} stream.".format(entity))
+        return
+
+    logger.info("Syncing {} from {}".format(entity, start))
+    max_updated = None
+    try:
+        # The listing only filters on created_at, so ratings edited after
+        # they were created are not picked up again
+        for row in gen_request(get_url(entity), {'created_since': start}, prefetch=True):
+            if row[bookmark_property] >= start:
+                writer.write_record(entity, transformer.transform(row))
+                metrics.record(entity)
+                max_updated = max(max_updated or row[bookmark_property], row[bookmark_property])
+    except HTTPError as e:
+        if e.response.status_code == 403:
+            set_feature_available(entity, False)
+            logger.info("The Surveys feature is unavailable. Skipping the satisfaction_ratings stream.")
+        else:
+            raise
+    else:
+        set_feature_available(entity, True)
+
+    update_state(entity, max_updated)
+    write_state()
+
+
+def sync_time_entries():
+    entity = "time_entries"
+    bookmark_property = 'updated_at'
+
+    write_schema(entity, bookmark_property)
+    transformer = schemas.get_transformer(entity)
+    start = get_start(entity)
+
+    if not is_feature_available(entity):
+        logger.info("The Timesheets feature was unavailable when last checked. Skipping the {} stream.".format(entity))
+        return
+
+    # The listing filters on executed_at, not updated_at, so it is read from
+    # a look-back before the bookmark and rows are filtered on updated_at
+    lookback = datetime.timedelta(days=float(CONFIG.get('time_entries_lookback_days', TIME_ENTRIES_LOOKBACK_DAYS)))
+    params = {
+        'executed_after': utils.strftime(singer.utils.strptime_to_utc(start) - lookback),
+        'executed_before': utils.strftime(singer.utils.now()),
+    }
+
+    logger.info("Syncing {} from {}".format(entity, start))
+    max_updated = None
+    try:
+        for row in gen_request(get_url(entity), params, prefetch=True):
+            if row[bookmark_property] >= start:
+                writer.write_record(entity, transformer.transform(row))
+                metrics.record(entity)
+                max_updated = max(max_updated or row[bookmark_property], row[bookmark_property])
+    except HTTPError as e:
+        if e.response.status_code == 403:
+            set_feature_available(entity, False)
+            logger.info("The Timesheets feature is unavailable. Skipping the time_entries stream.")
+        else:
+            raise
+    else:
+        set_feature_available(entity, True)
+
+    update_state(entity, max_updated)
+    write_state()
 
 
 def sync_time_filtered(entity):
     bookmark_property = 'updated_at'
 
-    singer.write_schema(entity,
-                        utils.load_schema(entity),
-                        ["id"],
-                        bookmark_properties=[bookmark_property])
+    write_schema(entity, bookmark_property)
+    transformer = schemas.get_transformer(entity)
     start = get_start(entity)
 
     logger.info("Syncing {} from {}".format(entity, start))
-    for row in gen_request(get_url(entity)):
+    # The listing is unordered, so the bookmark only moves once it has been
+    # read to the end; a checkpoint written by another stream in the meantime
+    # must not carry a partial maximum.
+    max_updated = None
+    for row in gen_time_filtered(entity, start):
         if row[bookmark_property] >= start:
-            if 'custom_fields' in row:
-                row['custom_fields'] = transform_dict(row['custom_fields'], force_str=True)
+            writer.write_record(entity, transformer.transform(row))
+            metrics.record(entity)
+            max_updated = max(max_updated or row[bookmark_property], row[bookmark_property])
+
+    update_state(entity, max_updated)
+    write_state()
 
-            utils.update_state(STATE, entity, row[bookmark_property])
-            singer.write_record(entity, row, time_extracted=singer.utils.now())
 
-    singer.write_state(STATE)
+def sync_contacts():
+    """Sync contacts through the _updated_since listing.
+
+    Progress is checkpointed in STATE['contacts_progress'] after every page so
+    an interrupted initial load resumes from the page it stopped at. After
+    CONTACTS_WINDOW_PAGES pages the listing is restarted from the newest
+    updated_at seen, which keeps page numbers small on large accounts. That is
+    only safe while the listing comes back in updated_at order, so a window
+    whose rows were out of order is paged to the end instead.
+    """
+    entity = "contacts"
+    bookmark_property = 'updated_at'
+
+    write_schema(entity, bookmark_property)
+    transformer = schemas.get_transformer(entity)
+    start = get_start(entity)
+
+    with state_lock:
+        progress = STATE.get('contacts_progress')
+    progress = progress or {'since': start, 'page': 0}
+    since = progress['since']
+    page = progress['page'] + 1
+    ordered = progress.get('ordered', True)
+    last_updated = progress.get('last_updated')
+    max_updated = progress.get('max_updated')
+    if page > 1:
+        logger.info("Resuming {} from {} at page {}".format(entity, since, page))
+    else:
+        logger.info("Syncing {} from {}".format(entity, since))
+
+    url = get_url(entity)
+    with get_checkpointer() as checkpointer:
+        while True:
+            params = {updated_since_params[entity]: since, 'per_page': PER_PAGE, 'page': page}
+            data = request(url, params).json()
+            metrics.page(url)
+            for row in transformer.transform_page(data):
+                if last_updated and row[bookmark_property] < last_updated:
+                    ordered = False
+                last_updated = row[bookmark_property]
+                max_updated = max(max_updated or last_updated, last_updated)
+                writer.write_record(entity, row)
+            metrics.record(entity, len(data))
+
+            if len(data) < PER_PAGE:
+                break
+
+            # A window can only restart from a newer updated_at; when every row
+            # read so far shares the one it started from, it is paged further
+            if page >= CONTACTS_WINDOW_PAGES and ordered and last_updated > since:
+                logger.info("Starting a new {} window from {}".format(entity, last_updated))
+                since, page = last_updated, 1
+            else:
+                page += 1
+
+            # Progress is only consistent between pages, so that is the only
+            # place a checkpoint can be taken
+            with state_lock:
+                STATE['contacts_progress'] = {
+                    'since': since,
+                    'page': page - 1,
+                    'ordered': ordered,
+                    'last_updated': last_updated,
+                    'max_updated': max_updated,
+                }
+            checkpointer.record(len(data))
+            checkpointer.page()
+
+        with state_lock:
+            STATE.pop('contacts_progress', None)
+            update_state(entity, max_updated)
+
+
+def gen_time_filtered(entity, start):
+    """Push the bookmark to the server through the search API where it
+    supports the entity, and otherwise read the whole listing. Neither
+    guarantees an order, so the caller still filters rows and every page is
+    read."""
+    if entity in search_queries:
+        # Search only filters on whole days; rows from earlier in the
+        # bookmark's day are dropped by the caller.
+        rows = search(entity, search_queries[entity].format(start[:10]))
+        if rows is not None:
+            return rows
+        logger.info("More than {} {} changed since {}, falling back to a full scan".format(
+            SEARCH_MAX_RESULTS, entity, start))
+
+    return gen_request(get_url(entity), prefetch=True)
+
+
+def run_streams(streams, workers):
+    """Run the stream syncs, up to `workers` of them at a time. They share
+    the rate limiter, the message writer and STATE. With one worker they run
+    one after the other in the order given. When a stream fails the others
+    are cancelled at their next request and the first error is raised."""
+    if workers <= 1:
+        for sync_stream in streams:
+            sync_stream()
+        return
+
+    cancel_event.clear()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(sync_stream) for sync_stream in streams]
+        done, pending = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+        failed = [future for future in futures if future in done and future.exception() is not None]
+        if not failed:
+            return
+        cancel_event.set()
+        for future in pending:
+            future.cancel()
+        concurrent.futures.wait(pending)
+
+    error = failed[0].exception()
+    for future in futures:
+        other = None if future.cancelled() else future.exception()
+        if other is not None and other is not error and not isinstance(other, SyncCancelled):
+            logger.error("Another stream also failed: {}".format(other))
+    raise error
+
+
+def handle_stop_signal(signum, frame):
+    logger.info("Received signal {}, stopping at the next request and writing a checkpoint".format(signum))
+    STOP_SIGNAL['signum'] = signum
+    stop_event.set()
 
 
 def do_sync():
+    global rate_limiter, budget, ticket_index
     logger.info("Starting FreshDesk sync")
 
+    rate_limiter = utils.RateLimiter(share=float(CONFIG.get('rate_limit_share', 1.0)))
+    budget = utils.CallBudget(int(CONFIG['request_budget']) if 'request_budget' in CONFIG else None)
+    ticket_index = utils.TicketIndex()
+    feature_checks.clear()
+
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, handle_stop_signal)
+        signal.signal(signal.SIGINT, handle_stop_signal)
+
+    streams = []
+    # The ticket listings are read whenever tickets or a stream fetched per
+    # ticket is selected
+    if schemas.is_selected("tickets") or get_ticket_children():
+        streams += [
+            functools.partial(sync_tickets_by_filter, 'updated_at'),
+            functools.partial(sync_filtered_tickets, "deleted"),
+            functools.partial(sync_filtered_tickets, "spam"),
+        ]
+    if schemas.is_selected("satisfaction_ratings"):
+        streams.append(sync_satisfaction_ratings)
+    if CONFIG.get('account_time_entries') and schemas.is_selected("time_entries"):
+        streams.append(sync_time_entries)
+    for entity in ["agents", "roles", "groups", "contacts", "companies"]:
+        if not schemas.is_selected(entity):
+            continue
+        if entity == "contacts":
+            streams.append(sync_contacts)
+        else:
+            streams.append(functools.partial(sync_time_filtered, entity))
+
     try:
-        sync_tickets()
-        sync_time_filtered("agents")
-        sync_time_filtered("roles")
-        sync_time_filtered("groups")
-        # commenting out this high-volume endpoint for now
-        #sync_time_filtered("contacts")
-        sync_time_filtered("companies")
+        write_ticket_schemas()
+        run_streams(streams, int(CONFIG.get('stream_workers', STREAM_WORKERS)))
+        writer.flush()
     except HTTPError as e:
         logger.critical(
             "Error making request to Freshdesk API: GET %s: [%s - %s]",
             e.request.url, e.response.status_code, e.response.content)
         sys.exit(1)
+    except SyncInterrupted as e:
+        logger.info("Sync interrupted, the last checkpoint covers every record written")
+        sys.exit(128 + (e.signum or 0))
+    except BudgetExhausted as e:
+        # Every stream stops at its next request; what they wrote is
+        # covered by the state, so the next run picks up from here
+        write_state()
+        writer.flush()
+        logger.warning("{}, stopping the sync. The last checkpoint covers every record written".format(e))
+        return
+    finally:
+        try:
+            writer.flush()
+        except Exception as e:
+            # Raising here would replace the error the sync stopped with
+            logger.error("Could not write every message: {}".format(e))
+        close_transport()
+        metrics.log_summary()
+        if CONFIG.get('metrics_textfile'):
+            metrics.write_prometheus(CONFIG['metrics_textfile'])
 
     logger.info("Completed sync")
 
 
 def main_impl():
-    config, state = utils.parse_args(REQUIRED_CONFIG_KEYS)
-    CONFIG.update(config)
-    STATE.update(state)
+    args = utils.parse_args(REQUIRED_CONFIG_KEYS)
+    CONFIG.update(args.config)
+    STATE.update(args.state)
+
+    if args.discover:
+        discover.write_catalog(discover.discover(schemas))
+        return
+
+    if args.catalog is not None:
+        schemas.select(discover.get_selection(args.catalog))
     do_sync()
 
 
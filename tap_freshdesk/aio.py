@@ -0,0 +1,103 @@
+import asyncio
+import collections
+import threading
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncEngine:
+    """Sends prepared requests on a single asyncio event loop.
+
+    The loop runs in a background thread and owns one aiohttp session, so
+    every thread calling `send` shares the same connection pool. `send`
+    blocks its caller until the response arrives: the engine replaces the
+    socket handling, not the worker threads, so as many requests are in
+    flight as there are threads calling `send`. Responses are returned
+    as `requests.Response` objects and transport failures are raised as
+    `requests` exceptions, which keeps the backoff and rate limit handling
+    wrapped around `request()` identical for both engines.
+
+    The session is configured from the same TransportOptions as the requests
+    engine: pool size, timeouts, keep-alive and compression.
+    """
+
+    def __init__(self, options):
+        if aiohttp is None:
+            raise Exception("The asyncio http_engine requires aiohttp. "
+                            "Install it with `pip install tap-freshdesk[asyncio]`.")
+
+        self.options = options
+        self.headers = options.headers()
+        # host -> [requests, connections], only touched on the loop thread
+        self.counts = collections.defaultdict(lambda: [0, 0])
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       name="tap-freshdesk-aio",
+                                       daemon=True)
+        self.thread.start()
+        self.session = self._run(self._open())
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _open(self):
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        connector = aiohttp.TCPConnector(limit_per_host=self.options.pool_size,
+                                         force_close=not self.options.keep_alive)
+        timeout = aiohttp.ClientTimeout(sock_connect=self.options.connect_timeout,
+                                        sock_read=self.options.read_timeout)
+        return aiohttp.ClientSession(connector=connector,
+                                     timeout=timeout,
+                                     auto_decompress=True,
+                                     trace_configs=[trace_config])
+
+    async def _on_request_start(self, session, context, params):
+        context.host = params.url.host
+        self.counts[context.host][0] += 1
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.counts[context.host][1] += 1
+
+    async def _send(self, req):
+        headers = dict(self.headers)
+        headers.update(req.headers)
+        try:
+            async with self.session.request(req.method, req.url,
+                                            headers=headers,
+                                            data=req.body) as resp:
+                content = await resp.read()
+        except asyncio.TimeoutError as e:
+            raise requests.exceptions.Timeout(e, request=req)
+        except aiohttp.ClientError as e:
+            raise requests.exceptions.ConnectionError(e, request=req)
+
+        response = requests.Response()
+        response.status_code = resp.status
+        response.reason = resp.reason
+        response.headers = CaseInsensitiveDict(resp.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = str(resp.url)
+        response.request = req
+        response._content = content
+        return response
+
+    def send(self, req):
+        return self._run(self._send(req))
+
+    def stats(self):
+        return {host: tuple(counts) for host, counts in list(self.counts.items())}
+
+    def close(self):
+        self._run(self.session.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
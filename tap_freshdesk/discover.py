@@ -0,0 +1,87 @@
+import json
+import sys
+
+import singer.metadata
+
+
+STREAMS = [
+    "agents",
+    "companies",
+    "contacts",
+    "conversations",
+    "groups",
+    "roles",
+    "satisfaction_ratings",
+    "tickets",
+    "time_entries",
+]
+KEY_PROPERTIES = ["id"]
+REPLICATION_KEY = "updated_at"
+
+
+def get_stream_metadata(schema):
+    mdata = singer.metadata.new()
+    mdata = singer.metadata.write(mdata, (), 'table-key-properties', KEY_PROPERTIES)
+    mdata = singer.metadata.write(mdata, (), 'valid-replication-keys', [REPLICATION_KEY])
+    mdata = singer.metadata.write(mdata, (), 'forced-replication-method', 'INCREMENTAL')
+    for prop in schema['properties']:
+        breadcrumb = ('properties', prop)
+        if prop in KEY_PROPERTIES or prop == REPLICATION_KEY:
+            mdata = singer.metadata.write(mdata, breadcrumb, 'inclusion', 'automatic')
+        else:
+            mdata = singer.metadata.write(mdata, breadcrumb, 'inclusion', 'available')
+            mdata = singer.metadata.write(mdata, breadcrumb, 'selected-by-default', True)
+    return singer.metadata.to_list(mdata)
+
+
+def discover(registry):
+    streams = []
+    for entity in STREAMS:
+        schema = registry.get_schema(entity)
+        streams.append({
+            'stream': entity,
+            'tap_stream_id': entity,
+            'key_properties': KEY_PROPERTIES,
+            'replication_key': REPLICATION_KEY,
+            'replication_method': 'INCREMENTAL',
+            'schema': schema,
+            'metadata': get_stream_metadata(schema),
+        })
+    return {'streams': streams}
+
+
+def write_catalog(catalog):
+    json.dump(catalog, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    sys.stdout.flush()
+
+
+def is_field_selected(mdata, prop):
+    breadcrumb = ('properties', prop)
+    if singer.metadata.get(mdata, breadcrumb, 'inclusion') == 'automatic':
+        return True
+    selected = singer.metadata.get(mdata, breadcrumb, 'selected')
+    if selected is None:
+        return singer.metadata.get(mdata, breadcrumb, 'selected-by-default') is not False
+    return selected
+
+
+def get_selection(catalog):
+    """Return {stream: set of selected fields} for the streams selected in
+    `catalog`. A stream is selected through the `selected` metadata of its
+    empty breadcrumb, or through `selected` in its schema in older catalogs."""
+    selection = {}
+    for stream in catalog.get('streams', []):
+        schema = stream.get('schema', {})
+        mdata = singer.metadata.to_map(stream.get('metadata', []))
+        selected = singer.metadata.get(mdata, (), 'selected')
+        if selected is None:
+            selected = schema.get('selected')
+        if not selected:
+            continue
+
+        selection[stream['tap_stream_id']] = {
+            prop for prop, prop_schema in schema.get('properties', {}).items()
+            if is_field_selected(mdata, prop) and prop_schema.get('selected') is not False
+        }
+    return selection
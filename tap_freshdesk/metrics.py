@@ -0,0 +1,179 @@
+import collections
+import os
+import re
+import threading
+from urllib.parse import urlsplit
+
+import singer
+from singer.metrics import Point, Tag
+
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+PROMETHEUS_PREFIX = "tap_freshdesk"
+
+ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def get_endpoint(url):
+    """Name a request by its path with ids replaced, so every ticket's
+    conversations share one endpoint."""
+    return ID_SEGMENT.sub("/{id}", urlsplit(url).path)
+
+
+def format_bound(bound):
+    return "+Inf" if bound == float("inf") else str(bound)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """(upper bound, observations at or below it) pairs, ending with +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics:
+    """Collects what the tap spends its time and requests on.
+
+    Every request is logged as a singer `http_request_duration` timer as it
+    completes. The totals below are logged as METRIC lines by `log_summary`
+    at the end of a run, and can be written to a Prometheus textfile:
+
+    - a latency histogram and a request count by status, per endpoint
+    - retries of failed requests and 429 responses, per endpoint
+    - seconds spent waiting on the rate limiter and in retry backoff,
+      against seconds spent on the network
+    - pages read per endpoint and records written per stream
+
+    All of it can be updated from any thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.logger = singer.get_logger()
+        self.latency = {}
+        self.statuses = collections.Counter()
+        self.retries = collections.Counter()
+        self.rate_limited = collections.Counter()
+        self.pages = collections.Counter()
+        self.records = collections.Counter()
+        self.sleep = collections.Counter()
+
+    def request(self, url, seconds, status_code):
+        endpoint = get_endpoint(url)
+        with self.lock:
+            if endpoint not in self.latency:
+                self.latency[endpoint] = Histogram(LATENCY_BUCKETS)
+            self.latency[endpoint].observe(seconds)
+            self.statuses[(endpoint, str(status_code))] += 1
+        singer.metrics.log(self.logger, Point('timer', singer.metrics.Metric.http_request_duration, seconds,
+                                              {Tag.endpoint: endpoint, Tag.http_status_code: status_code}))
+
+    def retry(self, url, wait):
+        with self.lock:
+            self.retries[get_endpoint(url)] += 1
+            self.sleep['backoff'] += wait
+
+    def rate_limit(self, url):
+        with self.lock:
+            self.rate_limited[get_endpoint(url)] += 1
+
+    def wait(self, seconds):
+        with self.lock:
+            self.sleep['rate_limit'] += seconds
+
+    def page(self, url):
+        with self.lock:
+            self.pages[get_endpoint(url)] += 1
+
+    def record(self, stream, count=1):
+        with self.lock:
+            self.records[stream] += count
+
+    def network_seconds(self):
+        return sum(histogram.sum for histogram in self.latency.values())
+
+    def log_summary(self):
+        with self.lock:
+            points = []
+            for endpoint, histogram in sorted(self.latency.items()):
+                points.append(Point('histogram', 'http_request_duration_summary',
+                                    {'count': histogram.count,
+                                     'sum': histogram.sum,
+                                     'buckets': {format_bound(bound): count
+                                                 for bound, count in histogram.cumulative()}},
+                                    {Tag.endpoint: endpoint}))
+            for endpoint, count in sorted(self.retries.items()):
+                points.append(Point('counter', 'http_retry_count', count, {Tag.endpoint: endpoint}))
+            for endpoint, count in sorted(self.rate_limited.items()):
+                points.append(Point('counter', 'http_rate_limited_count', count, {Tag.endpoint: endpoint}))
+            for endpoint, count in sorted(self.pages.items()):
+                points.append(Point('counter', 'page_count', count, {Tag.endpoint: endpoint}))
+            for stream, count in sorted(self.records.items()):
+                points.append(Point('counter', singer.metrics.Metric.record_count, count, {Tag.endpoint: stream}))
+            points.append(Point('timer', 'network_duration', self.network_seconds(), {}))
+            for reason in ['rate_limit', 'backoff']:
+                points.append(Point('timer', 'sleep_duration', self.sleep[reason], {'reason': reason}))
+        for point in points:
+            singer.metrics.log(self.logger, point)
+
+    def write_prometheus(self, path):
+        """Write the totals in the Prometheus text format, for the node
+        exporter's textfile collector. The file is replaced atomically."""
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            name = "{}_{}".format(PROMETHEUS_PREFIX, name)
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            for suffix, labels, value in samples:
+                label_text = ",".join('{}="{}"'.format(k, v) for k, v in labels)
+                if label_text:
+                    label_text = "{" + label_text + "}"
+                lines.append("{}{}{} {}".format(name, suffix, label_text, value))
+
+        with self.lock:
+            samples = []
+            for endpoint, histogram in sorted(self.latency.items()):
+                for bound, count in histogram.cumulative():
+                    samples.append(("_bucket", [("endpoint", endpoint), ("le", format_bound(bound))], count))
+                samples.append(("_sum", [("endpoint", endpoint)], histogram.sum))
+                samples.append(("_count", [("endpoint", endpoint)], histogram.count))
+            metric("http_request_duration_seconds", "histogram", "Latency of API requests.", samples)
+            metric("http_requests_total", "counter", "API requests by response status.",
+                   [("", [("endpoint", e), ("status", s)], n) for (e, s), n in sorted(self.statuses.items())])
+            metric("http_retries_total", "counter", "Requests retried after a failure.",
+                   [("", [("endpoint", e)], n) for e, n in sorted(self.retries.items())])
+            metric("http_rate_limited_total", "counter", "Responses with a 429 status.",
+                   [("", [("endpoint", e)], n) for e, n in sorted(self.rate_limited.items())])
+            metric("pages_total", "counter", "Listing pages read.",
+                   [("", [("endpoint", e)], n) for e, n in sorted(self.pages.items())])
+            metric("records_total", "counter", "Records written.",
+                   [("", [("stream", s)], n) for s, n in sorted(self.records.items())])
+            metric("sleep_seconds_total", "counter", "Time spent waiting before requests.",
+                   [("", [("reason", r)], self.sleep[r]) for r in ['rate_limit', 'backoff']])
+            metric("network_seconds_total", "counter", "Time spent on API requests.",
+                   [("", [], self.network_seconds())])
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
@@ -0,0 +1,119 @@
+import threading
+
+from tap_freshdesk import utils
+
+
+def transform_dict(d, key_key="name", value_key="value", force_str=False):
+    # Custom fields are expected to be strings, but sometimes the API sends
+    # booleans. We cast those to strings to match the schema.
+    rtn = []
+    for k, v in d.items():
+        if force_str:
+            v = str(v).lower()
+        rtn.append({key_key: k, value_key: v})
+    return rtn
+
+
+def get_converters(schema):
+    """Find the properties the API returns as a {key: value} object but the
+    schema describes as an array of {key_key: key, "value": value} objects,
+    such as custom_fields and ratings."""
+    converters = []
+    for key, prop in schema['properties'].items():
+        if 'array' not in prop.get('type', []):
+            continue
+        item_props = (prop.get('items') or {}).get('properties') or {}
+        if 'value' not in item_props or len(item_props) != 2:
+            continue
+        key_key = next(k for k in item_props if k != 'value')
+        force_str = 'string' in item_props['value'].get('type', [])
+        converters.append((key, key_key, force_str))
+    return converters
+
+
+class StreamTransformer:
+    """Shapes the rows of one stream to match its schema.
+
+    Everything that depends only on the schema is worked out once, when the
+    transformer is built: the set of properties to keep and the properties
+    that need converting. Transforming a row is then a single pass over its
+    keys, which drops the fields the schema does not list (attachments,
+    conversation bodies, ...) and converts the few that need it.
+    """
+
+    def __init__(self, schema):
+        self.keep = frozenset(schema['properties'])
+        self.converters = get_converters(schema)
+
+    def transform(self, row):
+        keep = self.keep
+        row = {k: v for k, v in row.items() if k in keep}
+        for key, key_key, force_str in self.converters:
+            value = row.get(key)
+            if isinstance(value, dict):
+                row[key] = transform_dict(value, key_key=key_key, force_str=force_str)
+        return row
+
+    def transform_page(self, rows):
+        transform = self.transform
+        return [transform(row) for row in rows]
+
+
+class SchemaRegistry:
+    """Loads each stream's schema from disk once and keeps it, along with the
+    transformer compiled from it, for the rest of the run.
+
+    When a catalog selects streams and fields, `select` restricts the
+    registry to them: unselected streams report as such, and the schemas
+    written and records emitted only carry the selected fields.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.schemas = {}
+        self.selected_schemas = {}
+        self.transformers = {}
+        self.selection = None
+
+    def select(self, selection):
+        """Restrict the registry to `selection`, {stream: set of fields}."""
+        with self.lock:
+            self.selection = selection
+            self.selected_schemas = {}
+            self.transformers = {}
+
+    def is_selected(self, entity, field=None):
+        selection = self.selection
+        if selection is None:
+            return True
+        if entity not in selection:
+            return False
+        return field is None or field in selection[entity]
+
+    def get_schema(self, entity):
+        with self.lock:
+            if entity not in self.schemas:
+                self.schemas[entity] = utils.load_schema(entity)
+            return self.schemas[entity]
+
+    def get_selected_schema(self, entity):
+        schema = self.get_schema(entity)
+        if self.selection is None:
+            return schema
+        with self.lock:
+            if entity not in self.selected_schemas:
+                fields = self.selection.get(entity, ())
+                selected = dict(schema)
+                selected['properties'] = {k: v for k, v in schema['properties'].items()
+                                          if k in fields}
+                self.selected_schemas[entity] = selected
+            return self.selected_schemas[entity]
+
+    def get_transformer(self, entity):
+        with self.lock:
+            transformer = self.transformers.get(entity)
+        if transformer is None:
+            transformer = StreamTransformer(self.get_selected_schema(entity))
+            with self.lock:
+                transformer = self.transformers.setdefault(entity, transformer)
+        return transformer
@@ -0,0 +1,122 @@
+import collections
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+# Seconds to wait for a connection to be established and for the server to
+# send data on it. A request that stalls past these is retried by request().
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 300
+
+
+class TransportOptions:
+    """Connection settings shared by both http engines."""
+
+    def __init__(self, pool_size, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, keep_alive=True, compression=True):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = keep_alive
+        self.compression = compression
+
+    def headers(self):
+        return {
+            'Accept-Encoding': 'gzip, deflate' if self.compression else 'identity',
+            'Connection': 'keep-alive' if self.keep_alive else 'close',
+        }
+
+
+def format_stats(stats):
+    """Describe the {host: (requests, connections)} stats of a transport."""
+    lines = []
+    for host, (num_requests, num_connections) in sorted(stats.items()):
+        lines.append("{}: {} requests over {} connections, {} reused".format(
+            host, num_requests, num_connections, max(num_requests - num_connections, 0)))
+    return lines
+
+
+class ConnectionCounter:
+    """Counts requests and newly opened connections per host."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = collections.defaultdict(lambda: [0, 0])
+
+    def add(self, host, requests=0, connections=0):
+        with self.lock:
+            counts = self.counts[host]
+            counts[0] += requests
+            counts[1] += connections
+
+    def stats(self):
+        with self.lock:
+            return {host: tuple(counts) for host, counts in self.counts.items()}
+
+
+def counting_pool(pool_cls, counter):
+    """Return a subclass of `pool_cls` whose connections report to `counter`
+    every time they open a socket, including when they reconnect."""
+    class CountingConnection(pool_cls.ConnectionCls):
+        def _new_conn(self):
+            sock = super()._new_conn()
+            counter.add(self.host, connections=1)
+            return sock
+
+    class CountingPool(pool_cls):
+        ConnectionCls = CountingConnection
+
+    return CountingPool
+
+
+class CountingAdapter(HTTPAdapter):
+    def __init__(self, counter, **kwargs):
+        self.counter = counter
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': counting_pool(HTTPConnectionPool, self.counter),
+            'https': counting_pool(HTTPSConnectionPool, self.counter),
+        }
+
+
+class Transport:
+    """Sends prepared requests through a pooled `requests` session.
+
+    The pool holds up to `pool_size` connections per host and blocks when
+    every one of them is busy, so the tap never opens more connections than
+    it has threads making requests. Every request is sent with the connect
+    and read timeouts, so a connection that hangs raises instead of stalling
+    the sync.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.counter = ConnectionCounter()
+        self.session = requests.Session()
+        self.adapter = CountingAdapter(self.counter,
+                                       pool_connections=1,
+                                       pool_maxsize=options.pool_size,
+                                       pool_block=True)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.headers = options.headers()
+
+    def send(self, req):
+        for name, value in self.headers.items():
+            req.headers.setdefault(name, value)
+        self.counter.add(urlsplit(req.url).hostname, requests=1)
+        return self.session.send(req, timeout=(self.options.connect_timeout,
+                                               self.options.read_timeout))
+
+    def stats(self):
+        return self.counter.stats()
+
+    def close(self):
+        self.session.close()
@@ -1,12 +1,20 @@
 import argparse
-import collections
+import array
+import calendar
 import datetime
-import functools
+import heapq
+import itertools
 import json
 import os
+import queue
+import threading
 import time
 
 DATETIME_FMT = "%Y-%m-%dT%H:%M:%SZ"
+# How often callers waiting on the rate limiter check whether to stop
+STOP_POLL_SECONDS = 0.5
+# Ticket ids per array of the TicketIndex
+INDEX_CHUNK = 65536
 
 
 def strptime(dt):
@@ -17,25 +25,175 @@ def strftime(dt):
     return dt.strftime(DATETIME_FMT)
 
 
-def ratelimit(limit, every):
-    def limitdecorator(fn):
-        times = collections.deque()
+class RateLimiter:
+    """Thread-safe token bucket sized from Freshdesk's rate limit headers.
 
-        @functools.wraps(fn)
-        def wrapper(*args, **kwargs):
-            if len(times) >= limit:
-                t0 = times.pop()
-                t = time.time()
-                sleep_time = every - (t - t0)
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
+    Freshdesk reports the per-minute allowance of the account in
+    `X-Ratelimit-Total` and what is left of it in `X-Ratelimit-Remaining`.
+    The tap may use `share` of the allowance: the bucket refills at
+    `share * total / 60` tokens per second and is clamped to what is left
+    once the rest of the allowance is set aside, so calls made by other
+    integrations are accounted for. A `Retry-After` header blocks every
+    caller until it has elapsed.
 
-            times.appendleft(time.time())
-            return fn(*args, **kwargs)
+    Callers waiting for a token are let through lowest `priority` first, and
+    in the order they arrived within a priority.
+    """
 
-        return wrapper
+    def __init__(self, per_minute=30, share=1.0):
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+        self.share = share
+        self.capacity = max(per_minute * share, 1.0)
+        self.rate = self.capacity / 60
+        self.tokens = 1.0
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiting = []
+        self.arrivals = itertools.count()
 
-    return limitdecorator
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def _next_token_in(self, now):
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0
+        return max(wait, self.blocked_until - now)
+
+    def acquire(self, priority=0, stop=()):
+        """Wait until a token is available and no caller ahead in line is
+        waiting for one, then take it. Returns the seconds waited, or None
+        when one of the `stop` events was set while waiting."""
+        start = time.monotonic()
+        with self.lock:
+            entry = (priority, next(self.arrivals))
+            heapq.heappush(self.waiting, entry)
+            try:
+                while True:
+                    if any(event.is_set() for event in stop):
+                        return None
+                    now = time.monotonic()
+                    self._refill(now)
+                    timeout = None
+                    if self.waiting[0] == entry:
+                        timeout = self._next_token_in(now)
+                        if timeout <= 0:
+                            self.tokens -= 1
+                            return now - start
+                    if stop:
+                        timeout = min(timeout or STOP_POLL_SECONDS, STOP_POLL_SECONDS)
+                    self.ready.wait(timeout)
+            finally:
+                self.waiting.remove(entry)
+                heapq.heapify(self.waiting)
+                self.ready.notify_all()
+
+    def update(self, headers):
+        """Resize the bucket from a response's headers. Returns the
+        Retry-After delay in seconds when the response carried one."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.ready.notify_all()
+            total = None
+            if 'X-Ratelimit-Total' in headers:
+                total = float(headers['X-Ratelimit-Total'])
+                self.capacity = max(total * self.share, 1.0)
+                self.rate = self.capacity / 60
+            if 'X-Ratelimit-Remaining' in headers:
+                reserved = total * (1 - self.share) if total is not None else 0
+                self.tokens = min(self.tokens, float(headers['X-Ratelimit-Remaining']) - reserved)
+            if 'Retry-After' in headers:
+                retry_after = int(headers['Retry-After'])
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+                self.tokens = min(self.tokens, 0.0)
+                return retry_after
+        return None
+
+
+class CallBudget:
+    """Counts the API calls of a run against `limit`, when one is set."""
+
+    def __init__(self, limit=None):
+        self.lock = threading.Lock()
+        self.limit = limit
+        self.spent = 0
+
+    def spend(self):
+        """Count a call. Returns False, without counting it, once the
+        budget has been spent."""
+        with self.lock:
+            if self.limit is not None and self.spent >= self.limit:
+                return False
+            self.spent += 1
+            return True
+
+
+class TicketIndex:
+    """Remembers the newest updated_at each ticket id was processed at
+    during a run. Timestamps are kept as epoch seconds in arrays of
+    INDEX_CHUNK ids, allocated as ids in their range are seen, so millions
+    of tickets take 4 bytes each."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.chunks = {}
+
+    def claim(self, ticket_id, updated_at):
+        """Record that the ticket is processed at `updated_at`. Returns False
+        when it was already processed at that version or a newer one."""
+        version = calendar.timegm(strptime(updated_at).timetuple())
+        chunk_id, offset = divmod(ticket_id, INDEX_CHUNK)
+        with self.lock:
+            chunk = self.chunks.get(chunk_id)
+            if chunk is None:
+                chunk = self.chunks[chunk_id] = array.array('I', bytes(4 * INDEX_CHUNK))
+            if chunk[offset] >= version:
+                return False
+            chunk[offset] = version
+            return True
+
+
+class Checkpointer:
+    """Coalesces STATE messages for a stream.
+
+    A checkpoint is written once `every_records` records have been
+    processed, once `every_seconds` have passed since the last one, or at
+    every page boundary when `on_page` is set; zero disables a trigger. Used
+    as a context manager it always writes a final checkpoint when the stream
+    ends, including when it ends with an exception.
+    """
+
+    def __init__(self, write_state, every_records=1, every_seconds=0, on_page=False):
+        self.write_state = write_state
+        self.every_records = every_records
+        self.every_seconds = every_seconds
+        self.on_page = on_page
+        self.pending = 0
+        self.last_checkpoint = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.checkpoint()
+        return False
+
+    def record(self, count=1):
+        self.pending += count
+        if self.every_records and self.pending >= self.every_records:
+            self.checkpoint()
+        elif self.every_seconds and time.monotonic() - self.last_checkpoint >= self.every_seconds:
+            self.checkpoint()
+
+    def page(self):
+        if self.on_page and self.pending:
+            self.checkpoint()
+
+    def checkpoint(self):
+        self.write_state()
+        self.pending = 0
+        self.last_checkpoint = time.monotonic()
 
 
 def chunk(l, n):
@@ -43,6 +201,54 @@ def chunk(l, n):
         yield l[i:i + n]
 
 
+def batch(iterable, n):
+    iterator = iter(iterable)
+    while True:
+        items = list(itertools.islice(iterator, n))
+        if not items:
+            return
+        yield items
+
+
+def prefetch(iterable, depth):
+    """Consume `iterable` on a background thread, keeping at most `depth`
+    items queued ahead of the caller. Exceptions are re-raised in the caller
+    and the thread stops once the caller closes the generator."""
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((False, item)):
+                    return
+        except Exception as e:
+            put((True, e))
+        else:
+            put((True, None))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            finished, item = items.get()
+            if finished:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stop.set()
+
+
 def get_abs_path(path):
     return os.path.join(os.path.dirname(os.path.realpath(__file__)), path)
 
@@ -74,17 +280,23 @@ def parse_args(required_config_keys):
     parser = argparse.ArgumentParser()
     parser.add_argument('-c', '--config', help='Config file', required=True)
     parser.add_argument('-s', '--state', help='State file')
+    parser.add_argument('--catalog', help='Catalog file')
+    parser.add_argument('-p', '--properties', help='Catalog file (deprecated, use --catalog)')
+    parser.add_argument('-d', '--discover', action='store_true', help='Do schema discovery')
     args = parser.parse_args()
 
-    config = load_json(args.config)
-    check_config(config, required_config_keys)
+    args.config = load_json(args.config)
+    check_config(args.config, required_config_keys)
 
     if args.state:
-        state = load_json(args.state)
+        args.state = load_json(args.state)
     else:
-        state = {}
+        args.state = {}
+
+    catalog_path = args.catalog or args.properties
+    args.catalog = load_json(catalog_path) if catalog_path else None
 
-    return config, state
+    return args
 
 
 def check_config(config, required_keys):
@@ -0,0 +1,106 @@
+import queue
+import sys
+import threading
+
+import singer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Messages that can be waiting for the writer thread before callers block
+QUEUE_SIZE = 1000
+# Bytes collected before they are written to stdout in one call
+BUFFER_SIZE = 64 * 1024
+
+
+def format_message(message):
+    if orjson is not None:
+        try:
+            return orjson.dumps(message.asdict()).decode('utf-8')
+        except TypeError:
+            # Decimals and other values orjson can't encode go through
+            # singer's own encoder
+            pass
+    return singer.format_message(message)
+
+
+class MessageWriter:
+    """Single point through which every Singer message is written.
+
+    Messages are serialized on a dedicated writer thread, which batches them
+    into large buffered writes to stdout. The queue in front of it is bounded
+    so a slow target pushes back on the streams instead of piling up memory.
+    Streams synced on different threads share one writer, and the messages
+    of any one thread keep the order it wrote them in: its SCHEMA before its
+    RECORDs, and a STATE after the records it covers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.thread = None
+        self.error = None
+
+    def _put(self, message):
+        with self.lock:
+            if self.error:
+                raise self.error
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run,
+                                               name="tap-freshdesk-writer",
+                                               daemon=True)
+                self.thread.start()
+        self.queue.put(message)
+
+    def _run(self):
+        while True:
+            messages = [self.queue.get()]
+            try:
+                if self.error:
+                    # Writing has failed; keep draining so no caller blocks
+                    continue
+
+                # Batch whatever else is already queued into the same write
+                lines = []
+                size = 0
+                while True:
+                    line = format_message(messages[-1]) + '\n'
+                    lines.append(line)
+                    size += len(line)
+                    if size >= BUFFER_SIZE:
+                        break
+                    try:
+                        messages.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                sys.stdout.write(''.join(lines))
+                sys.stdout.flush()
+            except Exception as e:
+                self.error = e
+            finally:
+                for _ in messages:
+                    self.queue.task_done()
+
+    def write_schema(self, stream, schema, key_properties, bookmark_properties=None):
+        self._put(singer.SchemaMessage(stream=stream,
+                                       schema=schema,
+                                       key_properties=key_properties,
+                                       bookmark_properties=bookmark_properties))
+
+    def write_record(self, stream, record):
+        self._put(singer.RecordMessage(stream=stream,
+                                       record=record,
+                                       time_extracted=singer.utils.now()))
+
+    def write_state(self, state):
+        self._put(singer.StateMessage(value=state))
+
+    def flush(self):
+        """Block until every queued message has been written."""
+        self.queue.join()
+        if self.error:
+            raise self.error
@@ -0,0 +1,15 @@
+"""Benchmarks of tap-freshdesk against the fake_freshdesk server.
+
+Run from the `tests` directory:
+
+    python -m benchmarks run --output before.json
+    python -m benchmarks run --output after.json
+    python -m benchmarks compare before.json after.json
+
+Each sync scenario runs in its own process and reports records per second,
+API calls per ticket, time spent waiting on the rate limiter, peak RSS and
+the bytes of RECORD messages emitted per stream. The micro-benchmarks
+time the per-record steps of the ticket hot path in nanoseconds per call.
+`compare` exits with status 1 when a metric got worse by more than the
+threshold.
+"""
@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import compare, micro, sync
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_in_subprocess(scenario, tickets, latency):
+    """Run a scenario in a fresh interpreter, so its peak memory is its own."""
+    with tempfile.TemporaryFile('w+') as stderr:
+        proc = subprocess.run([sys.executable, "-m", "benchmarks", "scenario", scenario,
+                               "--tickets", str(tickets), "--latency", str(latency)],
+                              stdout=subprocess.PIPE, stderr=stderr, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        if proc.returncode != 0:
+            stderr.seek(0)
+            sys.stderr.write(stderr.read()[-5000:])
+            raise Exception("Scenario {} failed with exit code {}".format(scenario, proc.returncode))
+    return json.loads(proc.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tap-freshdesk benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Run the benchmarks and write their results as JSON")
+    run.add_argument("--tickets", type=int, default=2000)
+    run.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    run.add_argument("--scenario", action="append", choices=sorted(sync.SCENARIOS),
+                     help="Sync scenario to run (repeatable, default all)")
+    run.add_argument("--skip-micro", action="store_true")
+    run.add_argument("--output", help="File to write the results to (default stdout)")
+
+    scenario = subparsers.add_parser("scenario", help="Run one sync scenario in this process")
+    scenario.add_argument("name", choices=sorted(sync.SCENARIOS))
+    scenario.add_argument("--tickets", type=int, default=2000)
+    scenario.add_argument("--latency", type=float, default=0.0)
+
+    diff = subparsers.add_parser("compare", help="Compare two result files")
+    diff.add_argument("base")
+    diff.add_argument("new")
+    diff.add_argument("--threshold", type=float, default=0.1,
+                      help="Fraction a metric may get worse by before it is a regression")
+
+    args = parser.parse_args()
+
+    if args.command == "scenario":
+        result = sync.run_scenario(args.name, args.tickets, args.latency)
+        sys.stdout.write(json.dumps(result) + "\n")
+        return
+
+    if args.command == "compare":
+        with open(args.base) as base, open(args.new) as new:
+            lines, regressions = compare.compare(json.load(base), json.load(new), args.threshold)
+        print("\n".join(lines))
+        if regressions:
+            print("{} metrics regressed by more than {:.0%}".format(len(regressions), args.threshold))
+            sys.exit(1)
+        return
+
+    results = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "tickets": args.tickets,
+        "latency": args.latency,
+        "sync": {},
+        "micro": {},
+    }
+    for name in args.scenario or sorted(sync.SCENARIOS):
+        print("Running sync scenario {}".format(name), file=sys.stderr)
+        results["sync"][name] = run_in_subprocess(name, args.tickets, args.latency)
+    if not args.skip_micro:
+        print("Running micro-benchmarks", file=sys.stderr)
+        results["micro"] = micro.run_micro()
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Compares two benchmark result files."""
+
+
+# Metrics where a larger number is an improvement; for the rest smaller is
+HIGHER_IS_BETTER = {"records_per_sec"}
+# Counts that only describe the run and are not compared
+INFORMATIONAL = {"records", "api_calls"}
+
+
+def flatten(results):
+    """Turn a results file into {metric name: value}."""
+    metrics = {}
+    for scenario, values in results.get("sync", {}).items():
+        for metric, value in values.items():
+            if metric == "bytes":
+                for stream, size in value.items():
+                    metrics["sync.{}.bytes.{}".format(scenario, stream)] = size
+            elif metric not in INFORMATIONAL:
+                metrics["sync.{}.{}".format(scenario, metric)] = value
+    for name, value in results.get("micro", {}).items():
+        metrics["micro.{}.ns_per_op".format(name)] = value
+    return metrics
+
+
+def compare(base, new, threshold):
+    """Return (lines, regressions) describing how `new` differs from `base`.
+    A metric regresses when it got worse by more than `threshold`, a
+    fraction of its base value."""
+    base_metrics = flatten(base)
+    new_metrics = flatten(new)
+    lines = ["{:<60} {:>14} {:>14} {:>8}".format(
+        "metric", base.get("commit", "base")[:12], new.get("commit", "new")[:12], "change")]
+    regressions = []
+    for name in sorted(set(base_metrics) & set(new_metrics)):
+        old, current = base_metrics[name], new_metrics[name]
+        change = (current - old) / old if old else 0.0
+        worse = -change if name.rsplit(".", 1)[-1] in HIGHER_IS_BETTER else change
+        flag = ""
+        if worse > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        lines.append("{:<60} {:>14.6g} {:>14.6g} {:>+7.1%}{}".format(name, old, current, change, flag))
+    return lines, regressions
@@ -0,0 +1,39 @@
+"""Micro-benchmarks of the per-record hot path."""
+import timeit
+
+import singer
+
+from fake_freshdesk import FakeAccount
+from tap_freshdesk import utils
+from tap_freshdesk.transform import SchemaRegistry, transform_dict
+from tap_freshdesk.writer import format_message
+
+
+REPEAT = 5
+
+
+def time_per_op(func, repeat=REPEAT):
+    """Best time of `repeat` runs, in nanoseconds per call."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def run_micro():
+    account = FakeAccount()
+    registry = SchemaRegistry()
+    ticket = account.ticket(1, includes=("requester", "company", "stats"))
+    transformer = registry.get_transformer("tickets")
+    record = transformer.transform(ticket)
+    message = singer.RecordMessage(stream="tickets", record=record,
+                                   time_extracted=singer.utils.now())
+    custom_fields = {"cf_field_{}".format(i): i % 2 == 0 for i in range(10)}
+    state = {"tickets": "2020-01-01T00:00:00Z"}
+
+    return {
+        "transform_dict": time_per_op(lambda: transform_dict(custom_fields, force_str=True)),
+        "update_state": time_per_op(lambda: utils.update_state(state, "tickets", "2020-01-01T00:00:01Z")),
+        "transform_ticket": time_per_op(lambda: transformer.transform(dict(ticket))),
+        "format_message": time_per_op(lambda: format_message(message)),
+        "format_message_singer": time_per_op(lambda: singer.format_message(message)),
+    }
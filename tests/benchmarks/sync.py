@@ -0,0 +1,73 @@
+"""End-to-end benchmarks: full syncs against a FakeFreshdesk."""
+import json
+import resource
+import sys
+
+from fake_freshdesk import FakeAccount, FakeFreshdesk
+from fake_freshdesk.harness import run_sync
+import tap_freshdesk
+
+
+# Each scenario is a tap config and FakeFreshdesk options
+SCENARIOS = {
+    "serial": {
+        "config": {"sub_ticket_workers": 1},
+        "server": {},
+    },
+    "default": {
+        "config": {},
+        "server": {},
+    },
+    "concurrent": {
+        "config": {"stream_workers": 3, "sub_ticket_workers": 8, "prefetch_pages": 2},
+        "server": {},
+    },
+    "windowed": {
+        "config": {"ticket_window_days": 0.25, "ticket_window_workers": 4, "sub_ticket_workers": 8},
+        "server": {},
+    },
+    "rate_limited": {
+        # Freshdesk's per-minute allowance, at 200 requests a second
+        "config": {"sub_ticket_workers": 8},
+        "server": {"rate_limit": 12000},
+    },
+}
+
+
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def run_scenario(name, tickets, latency=0.0):
+    scenario = SCENARIOS[name]
+    account = FakeAccount(tickets=tickets, contacts=tickets, companies=max(tickets // 10, 1))
+    server_options = dict(scenario["server"], latency=latency)
+    with FakeFreshdesk(account, **server_options) as server:
+        output = run_sync(server, scenario["config"])
+        api_calls = sum(server.requests.values())
+    # Taken before the output is read back, which would add to it
+    rss = peak_rss_kb()
+
+    records = {}
+    stream_bytes = {}
+    for line in output.lines():
+        message = json.loads(line)
+        if message['type'] == 'RECORD':
+            stream = message['stream']
+            records[stream] = records.get(stream, 0) + 1
+            stream_bytes[stream] = stream_bytes.get(stream, 0) + len(line.encode('utf-8'))
+
+    total_records = sum(records.values())
+    return {
+        "seconds": output.elapsed,
+        "records": total_records,
+        "records_per_sec": total_records / output.elapsed,
+        "api_calls": api_calls,
+        "api_calls_per_ticket": api_calls / max(records.get("tickets", 0), 1),
+        # Summed over every thread that waited
+        "rate_limit_sleep_seconds": tap_freshdesk.metrics.sleep['rate_limit'],
+        "peak_rss_kb": rss,
+        "bytes": stream_bytes,
+    }
@@ -0,0 +1,16 @@
+"""A local stand-in for the Freshdesk API, serving generated data.
+
+Point the tap at it with the `base_url` config key:
+
+    from fake_freshdesk import FakeAccount, FakeFreshdesk
+
+    with FakeFreshdesk(FakeAccount(tickets=1000000), latency=0.05) as server:
+        config = {"base_url": server.url, "domain": "fake", ...}
+
+or run it on its own from the `tests` directory with
+`python -m fake_freshdesk --tickets 1000000 --port 8080`.
+"""
+from fake_freshdesk.data import FakeAccount
+from fake_freshdesk.server import FakeFreshdesk
+
+__all__ = ["FakeAccount", "FakeFreshdesk"]
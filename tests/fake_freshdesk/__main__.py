@@ -0,0 +1,50 @@
+import argparse
+import time
+
+from fake_freshdesk import FakeAccount, FakeFreshdesk
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a generated Freshdesk account")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--tickets', type=int, default=1000)
+    parser.add_argument('--contacts', type=int, default=1000)
+    parser.add_argument('--companies', type=int, default=100)
+    parser.add_argument('--conversations-per-ticket', type=int, default=2)
+    parser.add_argument('--tickets-per-timestamp', type=int, default=1)
+    parser.add_argument('--contacts-per-timestamp', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--rate-limit', type=int, default=50000, help='Requests allowed per minute')
+    parser.add_argument('--forbidden', action='append', default=[],
+                        choices=["satisfaction_ratings", "time_entries"],
+                        help='Feature the account does not have (repeatable)')
+    parser.add_argument('--ticket-page-cap', type=int, default=300)
+    args = parser.parse_args()
+
+    account = FakeAccount(tickets=args.tickets,
+                          contacts=args.contacts,
+                          companies=args.companies,
+                          conversations_per_ticket=args.conversations_per_ticket,
+                          tickets_per_timestamp=args.tickets_per_timestamp,
+                          contacts_per_timestamp=args.contacts_per_timestamp,
+                          seed=args.seed)
+    server = FakeFreshdesk(account,
+                           host=args.host,
+                           port=args.port,
+                           latency=args.latency,
+                           rate_limit=args.rate_limit,
+                           forbidden=args.forbidden,
+                           page_caps={"tickets": args.ticket_page_cap})
+    with server:
+        print("Serving a fake Freshdesk account on {}".format(server.url), flush=True)
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
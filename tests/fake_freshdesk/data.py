@@ -0,0 +1,432 @@
+"""Synthetic Freshdesk account data.
+
+Nothing is stored: every row is computed from its id, so an account with
+millions of tickets costs no memory and the same settings always produce
+the same data. Ticket, contact and company ids are 1..N and their
+updated_at grows with the id, which lets listings find the first row of a
+page with arithmetic instead of a scan.
+"""
+import calendar
+import math
+import time
+
+
+DATETIME_FMT = "%Y-%m-%dT%H:%M:%SZ"
+EPOCH = "2020-01-01T00:00:00Z"
+
+
+def parse_datetime(value):
+    if len(value) == 10:
+        value = value + "T00:00:00Z"
+    return calendar.timegm(time.strptime(value, DATETIME_FMT))
+
+
+def format_datetime(seconds):
+    return time.strftime(DATETIME_FMT, time.gmtime(seconds))
+
+
+def lcm(*numbers):
+    result = 1
+    for n in numbers:
+        result = result * n // math.gcd(result, n)
+    return result
+
+
+def mix(n, seed):
+    """Cheap deterministic hash of an id, used to vary rows."""
+    n = (n * 0x9E3779B1 + seed * 0x85EBCA77) & 0xFFFFFFFF
+    n ^= n >> 15
+    n = (n * 0x2C1B3C6D) & 0xFFFFFFFF
+    n ^= n >> 12
+    return n
+
+
+class FakeAccount:
+    """A Freshdesk account described by a handful of sizes and frequencies.
+
+    Ticket `i` is deleted when `i % deleted_every == 0`, otherwise spam when
+    `i % spam_every == 0`. `tickets_per_timestamp` tickets, and
+    `contacts_per_timestamp` contacts, share each updated_at, to exercise
+    bookmarks that land in the middle of a run of equal timestamps. Each ticket has between 0 and
+    `2 * conversations_per_ticket` conversations, the last of which was
+    added when the ticket was last updated, except on every
+    `quiet_update_every`th ticket, last updated a day after its last
+    conversation without one being added. Every `time_entry_every`th
+    ticket that is not deleted or spam has a time entry and every
+    `rating_every`th ticket has a satisfaction rating.
+    """
+
+    def __init__(self, tickets=1000, contacts=1000, companies=100, agents=20,
+                 groups=5, roles=4, conversations_per_ticket=2, time_entry_every=7,
+                 rating_every=5, deleted_every=50, spam_every=70,
+                 tickets_per_timestamp=1, contacts_per_timestamp=1, ticket_spacing=60,
+                 contact_spacing=60, company_spacing=3600, quiet_update_every=0,
+                 start=EPOCH, seed=0):
+        self.num_tickets = tickets
+        self.num_contacts = contacts
+        self.num_companies = companies
+        self.num_agents = agents
+        self.num_groups = groups
+        self.num_roles = roles
+        self.conversations_per_ticket = conversations_per_ticket
+        self.time_entry_every = time_entry_every
+        self.rating_every = rating_every
+        self.deleted_every = deleted_every
+        self.spam_every = spam_every
+        self.tickets_per_timestamp = tickets_per_timestamp
+        self.contacts_per_timestamp = contacts_per_timestamp
+        self.ticket_spacing = ticket_spacing
+        self.contact_spacing = contact_spacing
+        self.company_spacing = company_spacing
+        self.quiet_update_every = quiet_update_every
+        self.start = parse_datetime(start)
+        self.seed = seed
+
+    # Tickets
+
+    def ticket_kind(self, i):
+        if i % self.deleted_every == 0:
+            return "deleted"
+        if i % self.spam_every == 0:
+            return "spam"
+        return None
+
+    def count_tickets(self, n, kind, every=1):
+        """Number of ticket ids <= n of `kind` that are multiples of `every`."""
+        def multiples(m):
+            return n // lcm(every, m)
+        deleted, spam = self.deleted_every, self.spam_every
+        if kind == "deleted":
+            return multiples(deleted)
+        if kind == "spam":
+            return multiples(spam) - multiples(lcm(spam, deleted))
+        return multiples(1) - multiples(deleted) - multiples(spam) + multiples(lcm(spam, deleted))
+
+    def select_tickets(self, kind, lo, offset, limit, every=1):
+        """Return up to `limit` ticket ids >= lo of `kind` that are
+        multiples of `every`, skipping the first `offset` of them."""
+        lo = max(lo, 1)
+        target = self.count_tickets(lo - 1, kind, every) + offset + 1
+        if self.count_tickets(self.num_tickets, kind, every) < target:
+            return []
+
+        # Smallest id whose count reaches the target is the first one returned
+        low, high = lo, self.num_tickets
+        while low < high:
+            mid = (low + high) // 2
+            if self.count_tickets(mid, kind, every) >= target:
+                high = mid
+            else:
+                low = mid + 1
+
+        ids = []
+        i = low
+        while i <= self.num_tickets and len(ids) < limit:
+            if self.ticket_kind(i) == kind:
+                ids.append(i)
+            i += every
+        return ids
+
+    def ticket_updated(self, i):
+        return self.start + (i - 1) // self.tickets_per_timestamp * self.ticket_spacing
+
+    def first_ticket_since(self, since):
+        """Smallest ticket id updated at or after `since` (in seconds)."""
+        delta = since - self.start
+        if delta <= 0:
+            return 1
+        steps = -(-delta // self.ticket_spacing)
+        return steps * self.tickets_per_timestamp + 1
+
+    def ticket(self, i, includes=()):
+        updated = self.ticket_updated(i)
+        created = updated - mix(i, self.seed) % (3 * 86400)
+        kind = self.ticket_kind(i)
+        row = {
+            "id": i,
+            "subject": "Ticket {}".format(i),
+            "description": "<div>Ticket {}</div>".format(i),
+            "description_text": "Ticket {}".format(i),
+            "status": 2 + mix(i, self.seed) % 4,
+            "priority": 1 + mix(i, self.seed + 1) % 4,
+            "source": 1 + mix(i, self.seed + 2) % 3,
+            "type": None,
+            "requester_id": self.contact_id(i),
+            "responder_id": self.agent_id(i),
+            "company_id": self.company_id(i),
+            "group_id": self.group_id(i),
+            "cc_emails": [],
+            "fwd_emails": [],
+            "reply_cc_emails": [],
+            "to_emails": None,
+            "tags": [],
+            "fr_escalated": False,
+            "is_escalated": False,
+            "spam": kind == "spam",
+            "deleted": kind == "deleted",
+            "due_by": format_datetime(created + 3 * 86400),
+            "fr_due_by": format_datetime(created + 86400),
+            "created_at": format_datetime(created),
+            "updated_at": format_datetime(updated),
+            "custom_fields": {"cf_escalated": i % 2 == 0, "cf_region": "eu" if i % 3 else None},
+            "attachments": [],
+        }
+        if "requester" in includes:
+            row["requester"] = {"id": row["requester_id"],
+                                "name": "Contact {}".format(row["requester_id"]),
+                                "email": "contact{}@example.com".format(row["requester_id"])}
+        if "company" in includes:
+            row["company"] = {"id": row["company_id"], "name": "Company {}".format(row["company_id"])}
+        if "stats" in includes:
+            row["stats"] = self.ticket_stats(i)
+        return row
+
+    def tickets(self, kind, since, offset, limit, includes=()):
+        ids = self.select_tickets(kind, self.first_ticket_since(since), offset, limit)
+        return [self.ticket(i, includes) for i in ids]
+
+    def ticket_stats(self, i):
+        times = self.conversation_times(i)
+        replied = format_datetime(times[-1]) if times else None
+        return {
+            "agent_responded_at": replied,
+            "requester_responded_at": replied,
+            "first_responded_at": format_datetime(times[0]) if times else None,
+            "status_updated_at": format_datetime(self.ticket_updated(i)),
+            "resolved_at": None,
+            "closed_at": None,
+        }
+
+    # Conversations and time entries of a ticket
+
+    def conversation_count(self, i):
+        return mix(i, self.seed + 3) % (2 * self.conversations_per_ticket + 1)
+
+    def conversation_times(self, i):
+        n = self.conversation_count(i)
+        updated = self.ticket_updated(i)
+        if self.is_quiet_update(i):
+            updated -= 86400
+        return [updated - (n - 1 - j) * 60 for j in range(n)]
+
+    def is_quiet_update(self, i):
+        return bool(self.quiet_update_every) and i % self.quiet_update_every == 0
+
+    def conversations(self, i):
+        rows = []
+        for j, updated in enumerate(self.conversation_times(i)):
+            rows.append({
+                "id": i * 1000 + j,
+                "ticket_id": i,
+                "body": "<div>Reply {} to ticket {}</div>".format(j, i),
+                "body_text": "Reply {} to ticket {}".format(j, i),
+                "incoming": j % 2 == 0,
+                "private": False,
+                "user_id": self.contact_id(i) if j % 2 == 0 else self.agent_id(i),
+                "support_email": None,
+                "source": 0,
+                "from_email": None,
+                "to_emails": [],
+                "cc_emails": [],
+                "bcc_emails": [],
+                "created_at": format_datetime(updated),
+                "updated_at": format_datetime(updated),
+                "attachments": [],
+            })
+        return rows
+
+    def has_time_entry(self, i):
+        return i % self.time_entry_every == 0 and self.ticket_kind(i) is None
+
+    def time_entry(self, i):
+        executed = format_datetime(self.ticket_updated(i))
+        return {
+            "id": i,
+            "ticket_id": i,
+            "agent_id": self.agent_id(i),
+            "billable": True,
+            "note": "",
+            "timer_running": False,
+            "time_spent": "00:{:02d}".format(mix(i, self.seed) % 60),
+            "start_time": executed,
+            "executed_at": executed,
+            "created_at": executed,
+            "updated_at": executed,
+        }
+
+    def ticket_time_entries(self, i):
+        return [self.time_entry(i)] if self.has_time_entry(i) else []
+
+    def time_entries(self, after, before, offset, limit):
+        """Account-wide time entries executed between `after` and `before`."""
+        ids = self.select_tickets(None, self.first_ticket_since(after), offset, limit,
+                                  every=self.time_entry_every)
+        return [self.time_entry(i) for i in ids
+                if before is None or self.ticket_updated(i) <= before]
+
+    # Satisfaction ratings
+
+    def satisfaction_ratings(self, since, offset, limit):
+        every = self.rating_every
+        first = -(-self.first_ticket_since(since) // every) + offset
+        last = min(first + limit - 1, self.num_tickets // every)
+        rows = []
+        for k in range(first, last + 1):
+            i = k * every
+            updated = format_datetime(self.ticket_updated(i))
+            rows.append({
+                "id": i,
+                "survey_id": 1,
+                "ticket_id": i,
+                "user_id": self.contact_id(i),
+                "agent_id": self.agent_id(i),
+                "group_id": self.group_id(i),
+                "feedback": "",
+                "ratings": {"default_question": 100 + mix(i, self.seed) % 4},
+                "created_at": updated,
+                "updated_at": updated,
+            })
+        return rows
+
+    # Contacts, companies, agents, groups and roles
+
+    def contact_id(self, i):
+        return 1 + mix(i, self.seed + 4) % max(self.num_contacts, 1)
+
+    def company_id(self, i):
+        return 1 + mix(i, self.seed + 5) % max(self.num_companies, 1)
+
+    def agent_id(self, i):
+        return 1 + mix(i, self.seed + 6) % max(self.num_agents, 1)
+
+    def group_id(self, i):
+        return 1 + mix(i, self.seed + 7) % max(self.num_groups, 1)
+
+    def contact_updated(self, i):
+        return self.start + ((i - 1) // self.contacts_per_timestamp + 1) * self.contact_spacing
+
+    def first_contact_since(self, since):
+        steps = -(-(since - self.start) // self.contact_spacing)
+        return max((steps - 1) * self.contacts_per_timestamp + 1, 1)
+
+    def count_contacts(self, since):
+        return max(self.num_contacts - self.first_contact_since(since) + 1, 0)
+
+    def contacts(self, since, offset, limit):
+        first = self.first_contact_since(since) + offset
+        last = min(first + limit - 1, self.num_contacts)
+        rows = []
+        for i in range(first, last + 1):
+            updated = format_datetime(self.contact_updated(i))
+            rows.append({
+                "id": i,
+                "name": "Contact {}".format(i),
+                "email": "contact{}@example.com".format(i),
+                "active": True,
+                "deleted": False,
+                "company_id": self.company_id(i),
+                "view_all_tickets": False,
+                "other_emails": [],
+                "other_companies": [],
+                "tags": [],
+                "language": "en",
+                "time_zone": "UTC",
+                "avatar": None,
+                "custom_fields": {"cf_vip": i % 10 == 0},
+                "created_at": updated,
+                "updated_at": updated,
+            })
+        return rows
+
+    def company(self, i):
+        updated = format_datetime(self.start + i * self.company_spacing)
+        return {
+            "id": i,
+            "name": "Company {}".format(i),
+            "description": None,
+            "note": None,
+            "domains": ["company{}.example.com".format(i)],
+            "custom_fields": {"cf_tier": "gold" if i % 5 == 0 else "silver"},
+            "created_at": updated,
+            "updated_at": updated,
+        }
+
+    def first_company_since(self, since):
+        return max(-(-(since - self.start) // self.company_spacing), 1)
+
+    def count_companies(self, since):
+        return max(self.num_companies - self.first_company_since(since) + 1, 0)
+
+    def companies(self, since, offset, limit):
+        first = self.first_company_since(since) + offset
+        last = min(first + limit - 1, self.num_companies)
+        return [self.company(i) for i in range(first, last + 1)]
+
+    def agents(self, offset, limit):
+        rows = []
+        for i in range(offset + 1, min(offset + limit, self.num_agents) + 1):
+            updated = format_datetime(self.start + i * 86400)
+            rows.append({
+                "id": i,
+                "available": True,
+                "available_since": None,
+                "occasional": False,
+                "signature": None,
+                "ticket_scope": 1,
+                "group_ids": [self.group_id(i)],
+                "role_ids": [1 + i % max(self.num_roles, 1)],
+                "contact": {"name": "Agent {}".format(i), "email": "agent{}@example.com".format(i)},
+                "created_at": updated,
+                "updated_at": updated,
+            })
+        return rows
+
+    def groups(self, offset, limit):
+        rows = []
+        for i in range(offset + 1, min(offset + limit, self.num_groups) + 1):
+            updated = format_datetime(self.start + i * 86400)
+            rows.append({
+                "id": i,
+                "name": "Group {}".format(i),
+                "description": None,
+                "agent_ids": [],
+                "auto_ticket_assign": False,
+                "business_hour_id": None,
+                "escalate_to": None,
+                "unassigned_for": None,
+                "created_at": updated,
+                "updated_at": updated,
+            })
+        return rows
+
+    def roles(self, offset, limit):
+        rows = []
+        for i in range(offset + 1, min(offset + limit, self.num_roles) + 1):
+            updated = format_datetime(self.start + i * 86400)
+            rows.append({
+                "id": i,
+                "name": "Role {}".format(i),
+                "description": None,
+                "default": i == 1,
+                "created_at": updated,
+                "updated_at": updated,
+            })
+        return rows
+
+    # Totals, for checking what a sync emitted
+
+    def expected_counts(self):
+        """Number of rows of each stream in the account. Walks every ticket,
+        so it is meant for the small accounts used in tests."""
+        tickets = range(1, self.num_tickets + 1)
+        return {
+            "tickets": self.num_tickets,
+            "conversations": sum(self.conversation_count(i) for i in tickets),
+            "time_entries": self.count_tickets(self.num_tickets, None, self.time_entry_every),
+            "satisfaction_ratings": self.num_tickets // self.rating_every,
+            "contacts": self.num_contacts,
+            "companies": self.num_companies,
+            "agents": self.num_agents,
+            "groups": self.num_groups,
+            "roles": self.num_roles,
+        }
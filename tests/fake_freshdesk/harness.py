@@ -0,0 +1,115 @@
+"""Runs the tap in-process against a FakeFreshdesk and collects its output."""
+import contextlib
+import json
+import signal
+import tempfile
+import time
+
+import singer.metadata
+
+import tap_freshdesk
+from tap_freshdesk import discover, utils
+from tap_freshdesk.metrics import Metrics
+from tap_freshdesk.transform import SchemaRegistry
+from tap_freshdesk.writer import MessageWriter
+
+
+START_DATE = "2019-01-01T00:00:00Z"
+
+
+def reset_tap():
+    """Put the tap's module state back to how a fresh process starts."""
+    tap_freshdesk.close_transport()
+    tap_freshdesk.CONFIG.clear()
+    tap_freshdesk.STATE.clear()
+    tap_freshdesk.STOP_SIGNAL.clear()
+    tap_freshdesk.stop_event.clear()
+    tap_freshdesk.cancel_event.clear()
+    tap_freshdesk.rate_limiter = utils.RateLimiter()
+    tap_freshdesk.writer = MessageWriter()
+    tap_freshdesk.metrics = Metrics()
+    tap_freshdesk.schemas.select(None)
+
+
+def make_catalog(streams, deselected=None):
+    """Discover a catalog with `streams` selected and the fields listed in
+    `deselected`, {stream: [field, ...]}, deselected."""
+    catalog = discover.discover(SchemaRegistry())
+    deselected = deselected or {}
+    for stream in catalog['streams']:
+        mdata = singer.metadata.to_map(stream['metadata'])
+        if stream['tap_stream_id'] in streams:
+            mdata = singer.metadata.write(mdata, (), 'selected', True)
+        for field in deselected.get(stream['tap_stream_id'], []):
+            mdata = singer.metadata.write(mdata, ('properties', field), 'selected', False)
+        stream['metadata'] = singer.metadata.to_list(mdata)
+    return catalog
+
+
+class SyncOutput:
+    """What the tap wrote, kept in a temporary file rather than in memory so
+    the memory used by the sync itself can be measured."""
+
+    def __init__(self, file, elapsed):
+        self.file = file
+        self.elapsed = elapsed
+        self._messages = None
+
+    def lines(self):
+        self.file.seek(0)
+        for line in self.file:
+            if line.strip():
+                yield line
+
+    @property
+    def messages(self):
+        if self._messages is None:
+            self._messages = [json.loads(line) for line in self.lines()]
+        return self._messages
+
+    def records(self, stream):
+        return [m['record'] for m in self.messages
+                if m['type'] == 'RECORD' and m['stream'] == stream]
+
+    def counts(self):
+        counts = {}
+        for m in self.messages:
+            if m['type'] == 'RECORD':
+                counts[m['stream']] = counts.get(m['stream'], 0) + 1
+        return counts
+
+    def schemas(self):
+        return {m['stream']: m for m in self.messages if m['type'] == 'SCHEMA'}
+
+    @property
+    def state(self):
+        states = [m['value'] for m in self.messages if m['type'] == 'STATE']
+        return states[-1] if states else None
+
+
+def run_sync(server, config=None, state=None, catalog=None):
+    """Sync every stream of `server` and return the messages written.
+    `config` is added to a config pointing the tap at the server."""
+    reset_tap()
+    tap_freshdesk.CONFIG.update({
+        "api_key": "fake",
+        "domain": "fake",
+        "base_url": server.url,
+        "start_date": START_DATE,
+    })
+    tap_freshdesk.CONFIG.update(config or {})
+    tap_freshdesk.STATE.update(state or {})
+    if catalog is not None:
+        tap_freshdesk.schemas.select(discover.get_selection(catalog))
+
+    handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGINT)}
+    stdout = tempfile.TemporaryFile('w+', encoding='utf-8')
+    try:
+        with contextlib.redirect_stdout(stdout):
+            start = time.perf_counter()
+            tap_freshdesk.do_sync()
+            elapsed = time.perf_counter() - start
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+    return SyncOutput(stdout, elapsed)
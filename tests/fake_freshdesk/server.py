@@ -0,0 +1,294 @@
+"""HTTP server standing in for the Freshdesk v2 API.
+
+It serves every route the tap requests from a FakeAccount, with the
+paging, filters and rate limit headers of the real API, plus switches for
+the failure modes the tap has to handle: latency, 429 with Retry-After,
+403 for features the account does not have, 404 for time entries of
+deleted and spam tickets, and page caps.
+"""
+import collections
+import gzip
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from fake_freshdesk.data import parse_datetime
+
+
+MAX_PER_PAGE = 100
+SEARCH_PER_PAGE = 30
+SEARCH_MAX_PAGES = 10
+# The tickets listing refuses pages past this one
+TICKET_PAGE_CAP = 300
+
+SUB_TICKET_ROUTE = re.compile(r"^/api/v2/tickets/(\d+)/(conversations|time_entries)$")
+SEARCH_ROUTE = re.compile(r"^/api/v2/search/(companies|contacts)$")
+SEARCH_QUERY = re.compile(r"^\"?updated_at:>'(\d{4}-\d{2}-\d{2})'\"?$")
+LISTINGS = {
+    "/api/v2/tickets": "tickets",
+    "/api/v2/contacts": "contacts",
+    "/api/v2/companies": "companies",
+    "/api/v2/agents": "agents",
+    "/api/v2/groups": "groups",
+    "/api/v2/roles": "roles",
+    "/api/v2/surveys/satisfaction_ratings": "satisfaction_ratings",
+    "/api/v2/time_entries": "time_entries",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, body=None, headers=None):
+        super().__init__(status)
+        self.status = status
+        self.body = body if body is not None else {"code": str(status)}
+        self.headers = headers or {}
+
+
+class RateLimit:
+    """Freshdesk's per-minute allowance. `window` can be shortened from 60
+    seconds so tests can run into the limit and out of it quickly."""
+
+    def __init__(self, per_window, window=60):
+        self.lock = threading.Lock()
+        self.per_window = per_window
+        self.window = window
+        self.window_start = time.monotonic()
+        self.used = 0
+
+    def take(self):
+        """Count a request. Returns the headers to send with the response,
+        and raises a 429 once the allowance is used up."""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.window_start = now
+                self.used = 0
+            if self.used >= self.per_window:
+                retry_after = math.ceil(self.window_start + self.window - now)
+                raise HTTPError(429, {"message": "You have exceeded the limit of requests per minute"},
+                                {"Retry-After": str(max(retry_after, 1)),
+                                 "X-Ratelimit-Total": str(self.per_window),
+                                 "X-Ratelimit-Remaining": "0"})
+            self.used += 1
+            return {"X-Ratelimit-Total": str(self.per_window),
+                    "X-Ratelimit-Remaining": str(self.per_window - self.used),
+                    "X-Ratelimit-Used-CurrentRequest": "1"}
+
+
+class FakeFreshdesk:
+    """Serves `account` on a local port until `stop` is called.
+
+    Options:
+    - `latency`: seconds every response is delayed by.
+    - `rate_limit`: requests allowed per `rate_limit_window` seconds; over
+      it requests get a 429 with Retry-After.
+    - `forbidden`: features the account does not have, from
+      "satisfaction_ratings" and "time_entries". Their routes return 403.
+    - `forbidden_ticket_every`: conversations and time entries of every Nth
+      ticket return 403, like tickets the API key can't see.
+    - `page_caps`: {listing: last page served}; later pages return 400.
+    - `compression`: gzip responses when the client accepts it.
+
+    `requests` counts the requests served per route, including failed ones,
+    `listing_params` keeps the query parameters of every listing request and
+    `ticket_includes` counts the includes asked for on ticket listings.
+    """
+
+    def __init__(self, account, host="127.0.0.1", port=0, latency=0.0,
+                 rate_limit=50000, rate_limit_window=60, forbidden=(),
+                 forbidden_ticket_every=0, page_caps=None, compression=True):
+        self.account = account
+        self.latency = latency
+        self.rate_limit = RateLimit(rate_limit, rate_limit_window)
+        self.forbidden = set(forbidden)
+        self.forbidden_ticket_every = forbidden_ticket_every
+        self.page_caps = {"tickets": TICKET_PAGE_CAP} if page_caps is None else page_caps
+        self.compression = compression
+        self.lock = threading.Lock()
+        self.requests = collections.Counter()
+        self.listing_params = collections.defaultdict(list)
+        self.ticket_includes = collections.Counter()
+
+        handler = type("Handler", (FakeFreshdeskHandler,), {"fake": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       name="fake-freshdesk", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def count(self, route):
+        with self.lock:
+            self.requests[route] += 1
+
+    # Routes
+
+    def handle(self, path, params):
+        match = SUB_TICKET_ROUTE.match(path)
+        if match:
+            self.count(match.group(2))
+            return self.sub_ticket(int(match.group(1)), match.group(2), params)
+
+        match = SEARCH_ROUTE.match(path)
+        if match:
+            self.count("search")
+            return self.search(match.group(1), params)
+
+        if path not in LISTINGS:
+            self.count("unknown")
+            raise HTTPError(404, {"code": "not_found"})
+
+        entity = LISTINGS[path]
+        self.count(entity)
+        with self.lock:
+            self.listing_params[entity].append(params)
+        if entity in self.forbidden:
+            raise HTTPError(403, {"code": "access_denied"})
+
+        page, per_page = get_paging(params)
+        if entity in self.page_caps and page > self.page_caps[entity]:
+            raise validation_error("page", "Must be less than or equal to {}".format(self.page_caps[entity]))
+
+        offset = (page - 1) * per_page
+        account = self.account
+        if entity == "tickets":
+            kind = params.get("filter")
+            if kind not in (None, "deleted", "spam"):
+                raise validation_error("filter", "It should be one of these values: 'deleted,spam'")
+            includes = [i for i in params.get("include", "").split(",") if i]
+            with self.lock:
+                self.ticket_includes.update(includes)
+            return account.tickets(kind, get_time(params, "updated_since"), offset, per_page, includes)
+        if entity == "contacts":
+            return account.contacts(get_time(params, "_updated_since"), offset, per_page)
+        if entity == "satisfaction_ratings":
+            return account.satisfaction_ratings(get_time(params, "created_since"), offset, per_page)
+        if entity == "time_entries":
+            before = get_time(params, "executed_before") if "executed_before" in params else None
+            return account.time_entries(get_time(params, "executed_after"), before, offset, per_page)
+        if entity == "companies":
+            return account.companies(0, offset, per_page)
+        return getattr(account, entity)(offset, per_page)
+
+    def sub_ticket(self, ticket_id, entity, params):
+        account = self.account
+        if not 1 <= ticket_id <= account.num_tickets:
+            raise HTTPError(404, {"code": "not_found"})
+        if entity in self.forbidden:
+            raise HTTPError(403, {"code": "access_denied"})
+
+        if self.forbidden_ticket_every and ticket_id % self.forbidden_ticket_every == 0:
+            raise HTTPError(403, {"code": "access_denied"})
+        if entity == "conversations":
+            rows = account.conversations(ticket_id)
+        else:
+            # Time entries of deleted and spam tickets are not found
+            if account.ticket_kind(ticket_id) is not None:
+                raise HTTPError(404, {"code": "not_found"})
+            rows = account.ticket_time_entries(ticket_id)
+
+        page, per_page = get_paging(params)
+        return rows[(page - 1) * per_page:page * per_page]
+
+    def search(self, entity, params):
+        match = SEARCH_QUERY.match(params.get("query", ""))
+        if not match:
+            raise validation_error("query", "Invalid query")
+        page = int(params.get("page", 1))
+        if page > SEARCH_MAX_PAGES:
+            raise validation_error("page", "Must be less than or equal to {}".format(SEARCH_MAX_PAGES))
+
+        # Search compares whole days, so everything from the start of the
+        # given day matches
+        since = parse_datetime(match.group(1))
+        offset = (page - 1) * SEARCH_PER_PAGE
+        if entity == "companies":
+            total = self.account.count_companies(since)
+            results = self.account.companies(since, offset, SEARCH_PER_PAGE)
+        else:
+            total = self.account.count_contacts(since)
+            results = self.account.contacts(since, offset, SEARCH_PER_PAGE)
+        return {"results": results, "total": total}
+
+
+def get_paging(params):
+    page = int(params.get("page", 1))
+    per_page = int(params.get("per_page", 30))
+    if per_page > MAX_PER_PAGE:
+        raise validation_error("per_page", "Must be less than or equal to {}".format(MAX_PER_PAGE))
+    return page, per_page
+
+
+def get_time(params, name):
+    if name not in params:
+        return 0
+    return parse_datetime(params[name])
+
+
+def validation_error(field, message):
+    return HTTPError(400, {"description": "Validation failed",
+                           "errors": [{"field": field, "message": message, "code": "invalid_value"}]})
+
+
+class FakeFreshdeskHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes, which Nagle's algorithm
+    # would hold back waiting for an ACK on every keep-alive request
+    disable_nagle_algorithm = True
+    fake = None
+
+    def do_GET(self):
+        fake = self.fake
+        url = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if fake.latency:
+            time.sleep(fake.latency)
+
+        headers = {}
+        try:
+            headers.update(fake.rate_limit.take())
+            status, body = 200, fake.handle(url.path, params)
+        except HTTPError as e:
+            status, body = e.status, e.body
+            headers.update(e.headers)
+
+        data = json.dumps(body).encode("utf-8")
+        if fake.compression and "gzip" in self.headers.get("Accept-Encoding", ""):
+            data = gzip.compress(data, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
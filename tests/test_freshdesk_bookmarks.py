@@ -76,8 +76,8 @@ class FreshdeskBookmarks(FreshdeskBaseTest):
 
     def test_run(self):
         """A Bookmarks Test"""
-        # Since this tap has no table and field selection all streams will sync every time. So define
-        # the subset of streams to run assertions against until all streams are covered
+        # Only the streams that have test data on the account are selected and
+        # asserted against, until all streams are covered
         self.test_streams = {'tickets', 'companies', 'agents', 'groups', 'roles', 'conversations'}
 
         expected_replication_keys = self.expected_replication_keys()
@@ -90,7 +90,12 @@ class FreshdeskBookmarks(FreshdeskBaseTest):
         conn_id = connections.ensure_connection(self)
 
         # Run in check mode
-        check_job_name = self.run_and_verify_check_mode(conn_id)
+        found_catalogs = self.run_and_verify_check_mode(conn_id)
+
+        # table and field selection
+        test_catalogs = [catalog for catalog in found_catalogs
+                         if catalog.get('stream_name') in self.test_streams]
+        self.perform_and_verify_table_and_field_selection(conn_id, test_catalogs)
 
         # Run a sync job using orchestrator
         first_sync_record_count = self.run_and_verify_sync(conn_id)
@@ -15,10 +15,10 @@ class FreshdeskCheckTest(FreshdeskBaseTest):
 
     def test_run(self):
         """
-        Freshdesk check test (does not run discovery).
-        Verify that check does NOT create a discovery catalog, schema, metadata, etc.
+        Freshdesk check test, which runs discovery.
+        Verify that check creates a discovery catalog for every stream.
 
-        • Verify check job does not populate found_catalogs
+        • Verify check job populates found_catalogs with every expected stream
         • Verify no critical errors are thrown for check job
         """
         streams_to_test = self.expected_streams()
@@ -20,8 +20,12 @@ class PaginationTest(FreshdeskBaseTest):
         streams_to_test = {'agents', 'tickets'}
 
         # Run check mode
-        # Check mode has no catalog discovery for freshdesk
-        check_job_name = self.run_and_verify_check_mode(conn_id)
+        found_catalogs = self.run_and_verify_check_mode(conn_id)
+
+        # Select the streams under test and all of their fields
+        test_catalogs = [catalog for catalog in found_catalogs
+                         if catalog.get('stream_name') in streams_to_test]
+        self.perform_and_verify_table_and_field_selection(conn_id, test_catalogs)
 
         # Run sync mode
         sync_record_count = self.run_and_verify_sync(conn_id)
@@ -48,7 +48,12 @@ class FreshdeskStartDateTest(FreshdeskBaseTest):
         conn_id_1 = connections.ensure_connection(self)
 
         # run check mode
-        check_job_name_1 = self.run_and_verify_check_mode(conn_id_1)
+        found_catalogs_1 = self.run_and_verify_check_mode(conn_id_1)
+
+        # table and field selection
+        test_catalogs_1 = [catalog for catalog in found_catalogs_1
+                           if catalog.get('stream_name') in test_streams]
+        self.perform_and_verify_table_and_field_selection(conn_id_1, test_catalogs_1)
 
         # run initial sync
         record_count_by_stream_1 = self.run_and_verify_sync(conn_id_1)
@@ -78,7 +83,12 @@ class FreshdeskStartDateTest(FreshdeskBaseTest):
         conn_id_2 = connections.ensure_connection(self, original_properties=False)
 
         # run check mode
-        check_job_name_2 = self.run_and_verify_check_mode(conn_id_2)
+        found_catalogs_2 = self.run_and_verify_check_mode(conn_id_2)
+
+        # table and field selection
+        test_catalogs_2 = [catalog for catalog in found_catalogs_2
+                           if catalog.get('stream_name') in test_streams]
+        self.perform_and_verify_table_and_field_selection(conn_id_2, test_catalogs_2)
 
         # run sync
         record_count_by_stream_2 = self.run_and_verify_sync(conn_id_2)
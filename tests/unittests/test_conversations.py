@@ -0,0 +1,38 @@
+import unittest
+
+import tap_freshdesk
+
+
+START = "2020-01-10T00:00:00Z"
+BEFORE = "2020-01-05T00:00:00Z"
+AFTER = "2020-01-11T00:00:00Z"
+
+
+def ticket(created_at=BEFORE, **stats):
+    row = {"id": 1, "created_at": created_at, "updated_at": AFTER}
+    if stats:
+        row["stats"] = dict({key: None for key in tap_freshdesk.CONVERSATION_STATS}, **stats)
+    return row
+
+
+class TestHasNewConversations(unittest.TestCase):
+
+    def test_tickets_created_since_start(self):
+        self.assertTrue(tap_freshdesk.has_new_conversations(
+            ticket(created_at=AFTER, agent_responded_at=BEFORE), START))
+
+    def test_tickets_without_stats(self):
+        self.assertTrue(tap_freshdesk.has_new_conversations(ticket(), START))
+
+    def test_replies_all_before_start(self):
+        self.assertFalse(tap_freshdesk.has_new_conversations(
+            ticket(agent_responded_at=BEFORE, requester_responded_at=BEFORE, first_responded_at=BEFORE),
+            START))
+
+    def test_stats_without_replies(self):
+        self.assertFalse(tap_freshdesk.has_new_conversations(ticket(status_updated_at=AFTER), START))
+
+    def test_agent_reply_since_start(self):
+        self.assertTrue(tap_freshdesk.has_new_conversations(
+            ticket(agent_responded_at=AFTER, requester_responded_at=BEFORE, first_responded_at=BEFORE),
+            START))
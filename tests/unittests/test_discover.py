@@ -0,0 +1,62 @@
+import unittest
+
+import singer.metadata
+
+from tap_freshdesk import discover
+from tap_freshdesk.transform import SchemaRegistry
+
+
+def find_stream(catalog, name):
+    return next(stream for stream in catalog['streams'] if stream['tap_stream_id'] == name)
+
+
+def set_metadata(stream, breadcrumb, key, value):
+    mdata = singer.metadata.to_map(stream['metadata'])
+    mdata = singer.metadata.write(mdata, breadcrumb, key, value)
+    stream['metadata'] = singer.metadata.to_list(mdata)
+
+
+class TestSelection(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = discover.discover(SchemaRegistry())
+
+    def test_discovered_streams_are_not_selected(self):
+        self.assertEqual({s['tap_stream_id'] for s in self.catalog['streams']}, set(discover.STREAMS))
+        self.assertEqual(discover.get_selection(self.catalog), {})
+
+    def test_selected_stream_keeps_fields_selected_by_default(self):
+        tickets = find_stream(self.catalog, "tickets")
+        set_metadata(tickets, (), 'selected', True)
+        self.assertEqual(discover.get_selection(self.catalog),
+                         {"tickets": set(tickets['schema']['properties'])})
+
+    def test_deselected_fields_are_left_out_but_automatic_ones_are_kept(self):
+        tickets = find_stream(self.catalog, "tickets")
+        set_metadata(tickets, (), 'selected', True)
+        for field in ["stats", "id", "updated_at"]:
+            set_metadata(tickets, ('properties', field), 'selected', False)
+
+        selected = discover.get_selection(self.catalog)["tickets"]
+        self.assertNotIn("stats", selected)
+        self.assertIn("id", selected)
+        self.assertIn("updated_at", selected)
+
+    def test_field_not_selected_by_default(self):
+        mdata = singer.metadata.to_map(find_stream(self.catalog, "agents")['metadata'])
+        mdata = singer.metadata.write(mdata, ('properties', 'available'), 'selected-by-default', False)
+        self.assertFalse(discover.is_field_selected(mdata, 'available'))
+        mdata = singer.metadata.write(mdata, ('properties', 'available'), 'selected', True)
+        self.assertTrue(discover.is_field_selected(mdata, 'available'))
+
+    def test_legacy_schema_selection(self):
+        agents = find_stream(self.catalog, "agents")
+        agents['schema']['selected'] = True
+        agents['schema']['properties']['available']['selected'] = False
+        selected = discover.get_selection(self.catalog)["agents"]
+        self.assertNotIn("available", selected)
+        self.assertIn("id", selected)
+
+
+if __name__ == '__main__':
+    unittest.main()
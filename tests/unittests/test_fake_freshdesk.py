@@ -0,0 +1,339 @@
+"""Offline syncs against the local Freshdesk stand-in."""
+import unittest
+from unittest import mock
+
+import requests
+
+import tap_freshdesk
+from tap_freshdesk.aio import AsyncEngine
+from tap_freshdesk.transport import TransportOptions
+from tap_freshdesk.writer import MessageWriter
+
+from fake_freshdesk import FakeAccount, FakeFreshdesk
+from fake_freshdesk.data import format_datetime, parse_datetime
+from fake_freshdesk.harness import make_catalog, reset_tap, run_sync
+
+
+def small_account(**kwargs):
+    options = dict(tickets=250, contacts=150, companies=40, agents=3, groups=2, roles=2)
+    options.update(kwargs)
+    return FakeAccount(**options)
+
+
+def sync_with_budget(server, config, budget, max_runs=50):
+    """Sync with `request_budget` set, resuming from the last state until a
+    run finishes within its budget. Returns the output of every run."""
+    outputs = []
+    state = None
+    for _ in range(max_runs):
+        before = sum(server.requests.values())
+        outputs.append(run_sync(server, dict(config, request_budget=budget), state=state))
+        state = outputs[-1].state
+        if sum(server.requests.values()) - before < budget:
+            return outputs
+    raise AssertionError("The sync did not finish in {} runs".format(max_runs))
+
+
+def records_of(outputs, stream):
+    return {r['id'] for output in outputs for r in output.records(stream)}
+
+
+def all_conversation_ids(account):
+    return {c['id'] for i in range(1, account.num_tickets + 1) for c in account.conversations(i)}
+
+
+class TestFakeFreshdeskSync(unittest.TestCase):
+
+    def tearDown(self):
+        reset_tap()
+
+    def test_full_sync_emits_every_row(self):
+        account = small_account()
+        with FakeFreshdesk(account) as server:
+            output = run_sync(server)
+
+        self.assertEqual(output.counts(), account.expected_counts())
+        tickets = output.records("tickets")
+        self.assertEqual(sorted(t['id'] for t in tickets), list(range(1, 251)))
+        self.assertEqual(sum(t['deleted'] for t in tickets), 250 // account.deleted_every)
+        self.assertEqual(output.state['tickets'], format_datetime(account.ticket_updated(249)))
+        self.assertEqual(output.state['tickets_deleted'], format_datetime(account.ticket_updated(250)))
+        self.assertEqual(output.state['contacts'], format_datetime(account.contact_updated(150)))
+
+    def test_sync_resumes_from_bookmark(self):
+        account = small_account()
+        bookmark = format_datetime(account.ticket_updated(200))
+        with FakeFreshdesk(account) as server:
+            output = run_sync(server, state={"tickets": bookmark})
+
+        # Deleted and spam tickets have bookmarks of their own
+        ids = [t['id'] for t in output.records("tickets")]
+        self.assertEqual([i for i in ids if account.ticket_kind(i) is None],
+                         [i for i in range(200, 251) if account.ticket_kind(i) is None])
+        self.assertEqual([i for i in ids if account.ticket_kind(i) == "deleted"],
+                         list(range(account.deleted_every, 251, account.deleted_every)))
+
+    def test_windowed_sync_emits_every_row(self):
+        account = small_account()
+        config = {"ticket_window_days": 0.25, "ticket_window_workers": 3}
+        with FakeFreshdesk(account) as server:
+            output = run_sync(server, config)
+
+        self.assertEqual(output.counts(), account.expected_counts())
+        self.assertEqual(sorted(t['id'] for t in output.records("tickets")), list(range(1, 251)))
+        self.assertEqual(output.state['tickets'], format_datetime(account.ticket_updated(249)))
+        self.assertNotIn('ticket_windows', output.state)
+        self.assertEqual(tap_freshdesk.metrics.pages["/api/v2/tickets"], server.requests["tickets"])
+
+    def test_windowed_sync_progresses_under_a_request_budget(self):
+        account = small_account()
+        config = {"ticket_window_days": 0.25, "ticket_window_workers": 2}
+        with FakeFreshdesk(account) as server:
+            outputs = sync_with_budget(server, config, 120)
+
+        self.assertGreater(len(outputs), 2)
+        self.assertIn('ticket_windows', outputs[0].state)
+        self.assertEqual(records_of(outputs, "tickets"), set(range(1, 251)))
+        self.assertEqual(records_of(outputs, "conversations"), all_conversation_ids(account))
+        self.assertEqual(outputs[-1].state['tickets'], format_datetime(account.ticket_updated(249)))
+        self.assertNotIn('ticket_windows', outputs[-1].state)
+
+    def test_resumed_windows_skip_tickets_written_at_their_last_timestamp(self):
+        account = small_account(tickets_per_timestamp=5)
+        config = {"ticket_window_days": 0.25, "ticket_window_workers": 2}
+        with FakeFreshdesk(account) as server:
+            outputs = sync_with_budget(server, config, 120)
+
+        self.assertGreater(len(outputs), 2)
+        ids = [t['id'] for output in outputs for t in output.records("tickets")]
+        self.assertEqual(sorted(ids), list(range(1, 251)))
+        self.assertNotIn('ticket_windows', outputs[-1].state)
+
+    def test_contacts_window_does_not_restart_on_a_shared_timestamp(self):
+        account = small_account(contacts=450, contacts_per_timestamp=300)
+        with FakeFreshdesk(account) as server, \
+                mock.patch.object(tap_freshdesk, 'CONTACTS_WINDOW_PAGES', 2):
+            output = run_sync(server, {"request_budget": 20}, catalog=make_catalog(["contacts"]))
+
+        ids = [c['id'] for c in output.records("contacts")]
+        self.assertEqual(sorted(set(ids)), list(range(1, 451)))
+        self.assertNotIn('contacts_progress', output.state)
+
+    def test_ticket_window_fails_on_a_timestamp_it_cannot_page_past(self):
+        account = small_account(tickets_per_timestamp=250)
+        with FakeFreshdesk(account, page_caps={"tickets": 2}) as server, \
+                mock.patch.object(tap_freshdesk, 'TICKET_MAX_PAGES', 2):
+            with self.assertRaisesRegex(Exception, "cannot page through"):
+                run_sync(server, {"ticket_window_days": 1, "request_budget": 20},
+                         catalog=make_catalog(["tickets"]))
+
+    def test_deleted_and_spam_scans_are_spaced_out(self):
+        account = small_account()
+        config = {"deleted_spam_scan_minutes": 60}
+        with FakeFreshdesk(account) as server:
+            first = run_sync(server, config)
+            listed = server.requests["tickets"]
+            second = run_sync(server, config, state=first.state)
+            # Only the default listing, which ends on its first page
+            self.assertEqual(server.requests["tickets"], listed + 1)
+
+        self.assertEqual(set(second.state['tickets_scanned_at']), {"tickets_deleted", "tickets_spam"})
+
+    def test_unavailable_features_are_remembered(self):
+        account = small_account()
+        config = {"sub_ticket_workers": 1}
+        with FakeFreshdesk(account, forbidden=["satisfaction_ratings", "time_entries"]) as server:
+            first = run_sync(server, config)
+            # One ticket's time entries, then the account-wide listing
+            self.assertEqual(server.requests["time_entries"], 2)
+            self.assertEqual(server.requests["satisfaction_ratings"], 1)
+            second = run_sync(server, config, state=first.state)
+            self.assertEqual(server.requests["time_entries"], 2)
+            self.assertEqual(server.requests["satisfaction_ratings"], 1)
+
+        self.assertEqual(set(second.state['unavailable_features']), {"time_entries", "satisfaction_ratings"})
+
+    def test_forbidden_tickets_do_not_turn_off_time_entries(self):
+        account = small_account()
+        with FakeFreshdesk(account, forbidden_ticket_every=14) as server:
+            output = run_sync(server)
+
+        self.assertNotIn('unavailable_features', output.state)
+        self.assertEqual({t['ticket_id'] for t in output.records("time_entries")},
+                         {i for i in range(1, 251) if account.has_time_entry(i) and i % 14})
+
+    def test_time_entries_of_deleted_and_spam_tickets_are_not_requested(self):
+        account = small_account()
+        with FakeFreshdesk(account) as server:
+            output = run_sync(server)
+            self.assertEqual(server.requests["time_entries"],
+                             sum(account.ticket_kind(i) is None for i in range(1, 251)))
+
+        self.assertEqual(output.counts(), account.expected_counts())
+        self.assertNotIn('unavailable_features', output.state)
+
+    def test_a_failing_stream_cancels_the_others(self):
+        account = small_account()
+        with FakeFreshdesk(account, forbidden=["agents"], latency=0.005) as server:
+            with self.assertRaises(SystemExit) as raised:
+                run_sync(server, {"stream_workers": 3})
+
+        self.assertEqual(raised.exception.code, 1)
+        self.assertEqual(server.requests["agents"], 1)
+        # The ticket sync stopped well short of each ticket's conversations
+        self.assertLess(server.requests["conversations"], 100)
+        self.assertEqual(server.requests["contacts"], 0)
+
+    def test_checkpoint_pages_alone_checkpoints_per_page(self):
+        account = small_account()
+        with FakeFreshdesk(account) as server:
+            output = run_sync(server, {"checkpoint_pages": True}, catalog=make_catalog(["tickets"]))
+
+        states = [m for m in output.messages if m['type'] == 'STATE']
+        # A few per listing rather than one per ticket
+        self.assertLess(len(states), 10)
+        self.assertEqual(output.counts()["tickets"], 250)
+
+    def test_asyncio_engine_syncs_every_row(self):
+        account = small_account()
+        with FakeFreshdesk(account) as server:
+            output = run_sync(server, {"http_engine": "asyncio"})
+
+        self.assertEqual(output.counts(), account.expected_counts())
+        self.assertEqual(output.state['tickets'], format_datetime(account.ticket_updated(249)))
+
+    def test_asyncio_engine_raises_timeouts(self):
+        options = TransportOptions(pool_size=1, read_timeout=0.05)
+        with FakeFreshdesk(small_account(), latency=0.5) as server:
+            engine = AsyncEngine(options)
+            try:
+                req = requests.Request('GET', server.url + "/api/v2/agents").prepare()
+                with self.assertRaises(requests.exceptions.Timeout):
+                    engine.send(req)
+            finally:
+                engine.close()
+
+    def test_writer_errors_do_not_hide_the_sync_error(self):
+        account = small_account()
+        with FakeFreshdesk(account, forbidden=["agents"]) as server, \
+                mock.patch.object(MessageWriter, 'flush', side_effect=OSError("Broken pipe")):
+            with self.assertRaises(SystemExit) as raised:
+                run_sync(server, catalog=make_catalog(["agents"]))
+
+        self.assertEqual(raised.exception.code, 1)
+
+    def test_conversations_are_skipped_for_tickets_without_new_replies(self):
+        account = small_account(quiet_update_every=3)
+        bookmark = format_datetime(account.ticket_updated(151))
+        config = {"skip_conversations_by_stats": True, "sub_ticket_workers": 1}
+        with FakeFreshdesk(account) as server:
+            state = {"tickets": bookmark, "tickets_deleted": bookmark, "tickets_spam": bookmark}
+            output = run_sync(server, config, state=state, catalog=make_catalog(["conversations"]))
+
+        synced = set(range(151, 251))
+        # Tickets created before the bookmark with no reply since, including
+        # those that never had one
+        skipped = {i for i in synced if account.ticket(i)['created_at'] < bookmark
+                   and (account.is_quiet_update(i) or not account.conversation_count(i))}
+        self.assertTrue(any(account.is_quiet_update(i) and account.conversation_count(i) for i in skipped))
+        self.assertEqual(server.requests["conversations"], len(synced - skipped))
+        expected = {c['id'] for i in synced - skipped for c in account.conversations(i)
+                    if c['updated_at'] >= bookmark}
+        self.assertEqual({c['id'] for c in output.records("conversations")}, expected)
+
+    def test_account_time_entries_are_listed_from_a_look_back(self):
+        account = small_account()
+        bookmark = format_datetime(account.ticket_updated(151))
+        config = {"account_time_entries": True}
+        with FakeFreshdesk(account) as server:
+            output = run_sync(server, config, state={"time_entries": bookmark},
+                              catalog=make_catalog(["tickets", "time_entries"]))
+
+        # Every time entries request went to the account-wide listing
+        listings = server.listing_params["time_entries"]
+        self.assertEqual(server.requests["time_entries"], len(listings))
+        self.assertEqual(listings[0]["executed_after"], format_datetime(parse_datetime(bookmark) - 30 * 86400))
+
+        with_entries = [i for i in range(1, 251) if account.has_time_entry(i)]
+        self.assertEqual({r['id'] for r in output.records("time_entries")},
+                         {i for i in with_entries if account.ticket_updated(i) >= parse_datetime(bookmark)})
+        self.assertEqual(output.state['time_entries'], format_datetime(account.ticket_updated(with_entries[-1])))
+
+    def test_deselected_streams_and_fields_are_not_requested(self):
+        account = small_account()
+        catalog = make_catalog(["tickets", "time_entries", "agents"], deselected={"tickets": ["stats"]})
+        with FakeFreshdesk(account) as server:
+            output = run_sync(server, {"skip_conversations_by_stats": True}, catalog=catalog)
+
+        self.assertEqual(server.requests["conversations"], 0)
+        self.assertEqual(server.requests["contacts"], 0)
+        self.assertNotIn("stats", server.ticket_includes)
+        self.assertIn("requester", server.ticket_includes)
+        self.assertEqual(set(output.schemas()), {"tickets", "time_entries", "agents"})
+        self.assertEqual(set(output.counts()), {"tickets", "time_entries", "agents"})
+        self.assertTrue(all("stats" not in t for t in output.records("tickets")))
+
+    def test_missing_features_are_skipped(self):
+        account = small_account()
+        with FakeFreshdesk(account, forbidden=["satisfaction_ratings", "time_entries"],
+                           forbidden_ticket_every=10) as server:
+            output = run_sync(server)
+
+        counts = output.counts()
+        self.assertNotIn("satisfaction_ratings", counts)
+        self.assertNotIn("time_entries", counts)
+        self.assertEqual(counts["tickets"], 250)
+        self.assertTrue(all(c['ticket_id'] % 10 for c in output.records("conversations")))
+
+    def test_request_budget_stops_with_a_checkpoint(self):
+        account = small_account()
+        with FakeFreshdesk(account) as server:
+            outputs = sync_with_budget(server, {}, 60)
+
+        self.assertGreater(len(outputs), 2)
+        self.assertLess(len({t['id'] for t in outputs[0].records("tickets")}), 250)
+        self.assertEqual(records_of(outputs, "tickets"), set(range(1, 251)))
+        self.assertEqual(records_of(outputs, "conversations"), all_conversation_ids(account))
+
+
+class TestFakeFreshdeskServer(unittest.TestCase):
+
+    def test_rate_limit_returns_retry_after(self):
+        with FakeFreshdesk(small_account(), rate_limit=2, rate_limit_window=30) as server:
+            url = server.url + "/api/v2/roles"
+            first = requests.get(url)
+            requests.get(url)
+            limited = requests.get(url)
+
+        self.assertEqual(first.headers['X-Ratelimit-Total'], "2")
+        self.assertEqual(first.headers['X-Ratelimit-Remaining'], "1")
+        self.assertEqual(limited.status_code, 429)
+        self.assertGreater(int(limited.headers['Retry-After']), 0)
+
+    def test_ticket_page_cap(self):
+        with FakeFreshdesk(small_account(), page_caps={"tickets": 2}) as server:
+            url = server.url + "/api/v2/tickets"
+            self.assertEqual(requests.get(url, params={"page": 2}).status_code, 200)
+            self.assertEqual(requests.get(url, params={"page": 3}).status_code, 400)
+
+    def test_time_entries_of_deleted_tickets_are_not_found(self):
+        account = small_account()
+        with FakeFreshdesk(account) as server:
+            url = server.url + "/api/v2/tickets/{}/time_entries"
+            self.assertEqual(requests.get(url.format(account.deleted_every)).status_code, 404)
+            self.assertEqual(requests.get(url.format(account.time_entry_every)).json(),
+                             [account.time_entry(account.time_entry_every)])
+
+    def test_listings_page_through_large_accounts(self):
+        account = FakeAccount(tickets=5000000)
+        with FakeFreshdesk(account, page_caps={}) as server:
+            page = requests.get(server.url + "/api/v2/tickets",
+                                params={"filter": "spam", "per_page": 100, "page": 500}).json()
+
+        self.assertEqual(len(page), 100)
+        self.assertTrue(all(t['spam'] for t in page))
+        self.assertEqual(account.count_tickets(page[0]['id'], "spam"), 499 * 100 + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
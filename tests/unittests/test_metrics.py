@@ -0,0 +1,38 @@
+import os
+import tempfile
+import unittest
+
+from tap_freshdesk.metrics import Metrics, get_endpoint
+
+
+class TestMetrics(unittest.TestCase):
+    def test_endpoint_ids_are_replaced(self):
+        self.assertEqual(get_endpoint("https://x.freshdesk.com/api/v2/tickets/123/conversations?page=2"),
+                         "/api/v2/tickets/{id}/conversations")
+        self.assertEqual(get_endpoint("https://x.freshdesk.com/api/v2/tickets/7"), "/api/v2/tickets/{id}")
+
+    def test_prometheus_textfile(self):
+        metrics = Metrics()
+        metrics.request("https://x.freshdesk.com/api/v2/tickets?page=1", 0.2, 200)
+        metrics.request("https://x.freshdesk.com/api/v2/tickets?page=2", 3.0, 429)
+        metrics.rate_limit("https://x.freshdesk.com/api/v2/tickets?page=2")
+        metrics.retry("https://x.freshdesk.com/api/v2/tickets?page=2", 1.5)
+        metrics.wait(0.5)
+        metrics.record("tickets", 100)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tap.prom")
+            metrics.write_prometheus(path)
+            with open(path) as f:
+                lines = f.read().splitlines()
+
+        self.assertIn('tap_freshdesk_http_request_duration_seconds_bucket'
+                      '{endpoint="/api/v2/tickets",le="0.25"} 1', lines)
+        self.assertIn('tap_freshdesk_http_request_duration_seconds_bucket'
+                      '{endpoint="/api/v2/tickets",le="+Inf"} 2', lines)
+        self.assertIn('tap_freshdesk_http_requests_total{endpoint="/api/v2/tickets",status="429"} 1', lines)
+        self.assertIn('tap_freshdesk_http_rate_limited_total{endpoint="/api/v2/tickets"} 1', lines)
+        self.assertIn('tap_freshdesk_records_total{stream="tickets"} 100', lines)
+        self.assertIn('tap_freshdesk_sleep_seconds_total{reason="rate_limit"} 0.5', lines)
+        self.assertIn('tap_freshdesk_sleep_seconds_total{reason="backoff"} 1.5', lines)
+        self.assertIn('tap_freshdesk_network_seconds_total 3.2', lines)
@@ -0,0 +1,59 @@
+import datetime
+import unittest
+
+import tap_freshdesk
+
+
+def utc(*args):
+    return datetime.datetime(*args, tzinfo=datetime.timezone.utc)
+
+
+class TestTicketWindows(unittest.TestCase):
+
+    def test_gaps_skip_completed_windows(self):
+        completed = [
+            ["2020-01-02T00:00:00Z", "2020-01-03T00:00:00Z", "2020-01-02T12:00:00Z"],
+            ["2020-01-05T00:00:00Z", "2020-01-06T00:00:00Z", None],
+        ]
+        gaps = tap_freshdesk.get_window_gaps(utc(2020, 1, 1), utc(2020, 1, 10), completed)
+        self.assertEqual(gaps, [(utc(2020, 1, 1), utc(2020, 1, 2)),
+                                (utc(2020, 1, 3), utc(2020, 1, 5)),
+                                (utc(2020, 1, 6), utc(2020, 1, 10))])
+
+    def test_no_gaps_when_everything_completed(self):
+        completed = [["2020-01-01T00:00:00Z", "2020-01-10T00:00:00Z", None]]
+        self.assertEqual(tap_freshdesk.get_window_gaps(utc(2020, 1, 1), utc(2020, 1, 5), completed), [])
+
+    def test_bookmark_only_moves_over_windows_without_a_gap(self):
+        since = "2020-01-01T00:00:00Z"
+        completed = [
+            ["2020-01-01T00:00:00Z", "2020-01-02T00:00:00Z", "2020-01-01T20:00:00Z"],
+            ["2020-01-02T00:00:00Z", "2020-01-03T00:00:00Z", None],
+            ["2020-01-04T00:00:00Z", "2020-01-05T00:00:00Z", "2020-01-04T10:00:00Z"],
+        ]
+        self.assertEqual(tap_freshdesk.get_completed_bookmark(since, completed), "2020-01-01T20:00:00Z")
+        self.assertIsNone(tap_freshdesk.get_completed_bookmark(since, completed[2:]))
+
+    def test_sizer_aims_for_the_target_page_count(self):
+        sizer = tap_freshdesk.WindowSizer(86400)
+        sizer.observe(86400, tap_freshdesk.TICKET_WINDOW_PAGES * 2)
+        self.assertEqual(sizer.seconds, 43200)
+        # A sparse window grows the next one at most 4x
+        sizer.observe(43200, 1)
+        self.assertEqual(sizer.seconds, 43200 * 4)
+        # and a dense one never shrinks it below the minimum
+        sizer.observe(60, 100000)
+        self.assertEqual(sizer.seconds, tap_freshdesk.TICKET_WINDOW_MIN_SECONDS)
+
+    def test_windows_cover_the_gaps(self):
+        sizer = tap_freshdesk.WindowSizer(86400)
+        gaps = [(utc(2020, 1, 1), utc(2020, 1, 3, 12)), (utc(2020, 1, 5), utc(2020, 1, 6))]
+        windows = list(tap_freshdesk.plan_ticket_windows(gaps, sizer))
+        self.assertEqual(windows, [(utc(2020, 1, 1), utc(2020, 1, 2)),
+                                   (utc(2020, 1, 2), utc(2020, 1, 3)),
+                                   (utc(2020, 1, 3), utc(2020, 1, 3, 12)),
+                                   (utc(2020, 1, 5), utc(2020, 1, 6))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+
+from tap_freshdesk.transform import SchemaRegistry, StreamTransformer, get_converters, transform_dict
+
+
+def array_of(key_key, value_type):
+    return {
+        "type": ["null", "array"],
+        "items": {
+            "type": ["null", "object"],
+            "properties": {
+                key_key: {"type": ["null", "string"]},
+                "value": {"type": ["null", value_type]},
+            },
+        },
+    }
+
+
+class TestConverters(unittest.TestCase):
+
+    def test_key_value_arrays_are_converted(self):
+        schema = {"properties": {
+            "custom_fields": array_of("name", "string"),
+            "ratings": array_of("question", "integer"),
+            "id": {"type": ["null", "integer"]},
+        }}
+        self.assertEqual(sorted(get_converters(schema)),
+                         [("custom_fields", "name", True), ("ratings", "question", False)])
+
+    def test_other_arrays_are_left_alone(self):
+        schema = {"properties": {
+            "tags": {"type": ["null", "array"], "items": {"type": ["null", "string"]}},
+            "attachments": {"type": ["null", "array"], "items": {
+                "type": ["null", "object"],
+                "properties": {"name": {"type": "string"}, "value": {"type": "string"},
+                               "size": {"type": "integer"}}}},
+            "cc_emails": {"type": ["null", "array"]},
+        }}
+        self.assertEqual(get_converters(schema), [])
+
+    def test_bundled_schemas(self):
+        registry = SchemaRegistry()
+        self.assertIn(("custom_fields", "name", True), get_converters(registry.get_schema("tickets")))
+        self.assertIn(("ratings", "question", False), get_converters(registry.get_schema("satisfaction_ratings")))
+
+    def test_transform_dict(self):
+        self.assertEqual(transform_dict({"cf_vip": True, "cf_count": 3}, force_str=True),
+                         [{"name": "cf_vip", "value": "true"}, {"name": "cf_count", "value": "3"}])
+        self.assertEqual(transform_dict({"default_question": 103}, key_key="question"),
+                         [{"question": "default_question", "value": 103}])
+
+
+class TestStreamTransformer(unittest.TestCase):
+
+    def test_tickets(self):
+        transformer = SchemaRegistry().get_transformer("tickets")
+        row = transformer.transform({
+            "id": 1,
+            "custom_fields": {"cf_vip": False, "cf_region": "EU", "cf_empty": None},
+            "attachments": [{"id": 5}],
+            "not_in_schema": "dropped",
+        })
+        self.assertEqual(row, {"id": 1, "custom_fields": [
+            {"name": "cf_vip", "value": "false"},
+            {"name": "cf_region", "value": "eu"},
+            {"name": "cf_empty", "value": "none"},
+        ]})
+
+    def test_ratings_values_are_not_coerced(self):
+        transformer = SchemaRegistry().get_transformer("satisfaction_ratings")
+        row = transformer.transform({"id": 1, "ratings": {"default_question": 103, "question_2": -102}})
+        self.assertEqual(row["ratings"], [{"question": "default_question", "value": 103},
+                                          {"question": "question_2", "value": -102}])
+
+    def test_already_converted_values_are_kept(self):
+        transformer = StreamTransformer({"properties": {"custom_fields": array_of("name", "string")}})
+        converted = [{"name": "cf_vip", "value": "true"}]
+        self.assertEqual(transformer.transform({"custom_fields": converted}), {"custom_fields": converted})
+        self.assertEqual(transformer.transform({"custom_fields": None}), {"custom_fields": None})
+
+    def test_selected_fields_only(self):
+        registry = SchemaRegistry()
+        registry.select({"tickets": {"id", "updated_at"}})
+        transformer = registry.get_transformer("tickets")
+        self.assertEqual(transformer.transform_page([{"id": 1, "updated_at": "x", "subject": "s"}]),
+                         [{"id": 1, "updated_at": "x"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
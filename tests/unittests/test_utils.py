@@ -0,0 +1,168 @@
+import threading
+import time
+import unittest
+
+import requests
+
+import tap_freshdesk
+from tap_freshdesk import utils
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_waiting_callers_go_in_priority_order(self):
+        limiter = utils.RateLimiter(per_minute=600)
+        limiter.tokens = -1.0
+        order = []
+
+        def acquire(priority):
+            limiter.acquire(priority)
+            order.append(priority)
+
+        threads = []
+        for priority in [2, 1, 0]:
+            thread = threading.Thread(target=acquire, args=(priority,))
+            thread.start()
+            threads.append(thread)
+            while len(limiter.waiting) < len(threads):
+                time.sleep(0.001)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order, [0, 1, 2])
+
+    def test_acquire_stops_when_asked(self):
+        limiter = utils.RateLimiter(per_minute=1)
+        limiter.tokens = -10.0
+        stop = threading.Event()
+        stop.set()
+        self.assertIsNone(limiter.acquire(stop=[stop]))
+        self.assertEqual(limiter.waiting, [])
+
+    def test_share_sets_aside_the_rest_of_the_allowance(self):
+        limiter = utils.RateLimiter(share=0.5)
+        limiter.update({'X-Ratelimit-Total': '100', 'X-Ratelimit-Remaining': '60'})
+        self.assertEqual(limiter.capacity, 50)
+        self.assertLessEqual(limiter.tokens, 10)
+
+    def test_budget(self):
+        budget = utils.CallBudget(2)
+        self.assertEqual([budget.spend() for _ in range(3)], [True, True, False])
+        self.assertTrue(all(utils.CallBudget().spend() for _ in range(100)))
+
+
+class TestCheckpointer(unittest.TestCase):
+
+    def setUp(self):
+        self.written = []
+
+    def write_state(self):
+        self.written.append(time.monotonic())
+
+    def test_every_records(self):
+        checkpointer = utils.Checkpointer(self.write_state, every_records=3)
+        for _ in range(7):
+            checkpointer.record()
+        self.assertEqual(len(self.written), 2)
+        checkpointer.record(5)
+        self.assertEqual(len(self.written), 3)
+
+    def test_every_seconds(self):
+        checkpointer = utils.Checkpointer(self.write_state, every_records=0, every_seconds=0.05)
+        checkpointer.record()
+        self.assertEqual(self.written, [])
+        time.sleep(0.06)
+        checkpointer.record()
+        self.assertEqual(len(self.written), 1)
+
+    def test_on_page_only_with_pending_records(self):
+        checkpointer = utils.Checkpointer(self.write_state, every_records=0, on_page=True)
+        checkpointer.page()
+        self.assertEqual(self.written, [])
+        checkpointer.record()
+        checkpointer.record()
+        self.assertEqual(self.written, [])
+        checkpointer.page()
+        self.assertEqual(len(self.written), 1)
+        checkpointer.page()
+        self.assertEqual(len(self.written), 1)
+
+    def test_writes_on_exit_when_the_stream_fails(self):
+        with self.assertRaises(ValueError):
+            with utils.Checkpointer(self.write_state, every_records=0) as checkpointer:
+                checkpointer.record()
+                raise ValueError()
+        self.assertEqual(len(self.written), 1)
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test_stays_at_most_depth_items_ahead(self):
+        produced = []
+
+        def produce():
+            for i in range(100):
+                produced.append(i)
+                yield i
+
+        items = utils.prefetch(produce(), 3)
+        self.assertEqual(next(items), 0)
+        time.sleep(0.3)
+        # The item handed over, a full queue and one waiting to be queued
+        self.assertLessEqual(len(produced), 5)
+        self.assertEqual(list(items), list(range(1, 100)))
+
+    def test_producer_errors_are_raised_in_the_caller(self):
+        response = requests.Response()
+        response.status_code = 500
+        errors = [requests.exceptions.HTTPError(response=response),
+                  tap_freshdesk.SyncInterrupted(15),
+                  tap_freshdesk.BudgetExhausted(10)]
+        for error in errors:
+            def produce():
+                yield 1
+                raise error
+
+            received = []
+            with self.assertRaises(type(error)) as raised:
+                for item in utils.prefetch(produce(), 2):
+                    received.append(item)
+            self.assertIs(raised.exception, error)
+            self.assertEqual(received, [1])
+
+    def test_producer_stops_when_the_caller_closes(self):
+        threads = []
+
+        def produce():
+            threads.append(threading.current_thread())
+            i = 0
+            while True:
+                i += 1
+                yield i
+
+        items = utils.prefetch(produce(), 2)
+        self.assertEqual(next(items), 1)
+        items.close()
+        threads[0].join(1)
+        self.assertFalse(threads[0].is_alive())
+
+
+class TestTicketIndex(unittest.TestCase):
+
+    def test_versions_are_claimed_once(self):
+        index = utils.TicketIndex()
+        self.assertTrue(index.claim(7, "2020-01-01T00:00:00Z"))
+        self.assertFalse(index.claim(7, "2020-01-01T00:00:00Z"))
+        self.assertFalse(index.claim(7, "2019-12-31T23:59:59Z"))
+        self.assertTrue(index.claim(7, "2020-01-01T00:00:01Z"))
+        self.assertTrue(index.claim(8, "2020-01-01T00:00:00Z"))
+
+    def test_sparse_ids_only_allocate_their_chunks(self):
+        index = utils.TicketIndex()
+        for ticket_id in [1, 2, 10 ** 9]:
+            self.assertTrue(index.claim(ticket_id, "2020-01-01T00:00:00Z"))
+        self.assertEqual(len(index.chunks), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
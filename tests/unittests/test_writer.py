@@ -0,0 +1,110 @@
+import decimal
+import importlib
+import io
+import json
+import threading
+import unittest
+from unittest import mock
+
+import singer
+
+from tap_freshdesk.writer import MessageWriter, format_message
+
+# tap_freshdesk.writer is shadowed by the tap's MessageWriter instance
+writer = importlib.import_module('tap_freshdesk.writer')
+
+
+class BlockingOutput(io.StringIO):
+    """Stands in for stdout; writes wait until `release` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.writes = 0
+
+    def write(self, text):
+        self.release.wait(5)
+        self.writes += 1
+        return super().write(text)
+
+    def lines(self):
+        return [json.loads(line) for line in self.getvalue().splitlines()]
+
+
+class FailingOutput(io.StringIO):
+
+    def write(self, text):
+        raise OSError("Broken pipe")
+
+
+class TestMessageWriter(unittest.TestCase):
+
+    def test_queued_messages_are_batched_into_one_write(self):
+        output = BlockingOutput()
+        message_writer = MessageWriter()
+        with mock.patch('sys.stdout', output):
+            message_writer.write_state({"n": 0})
+            for i in range(50):
+                message_writer.write_record("tickets", {"id": i})
+            output.release.set()
+            message_writer.flush()
+
+        self.assertEqual(len(output.lines()), 51)
+        self.assertLessEqual(output.writes, 2)
+
+    def test_a_full_queue_blocks_the_caller(self):
+        output = BlockingOutput()
+        with mock.patch.object(writer, 'QUEUE_SIZE', 2), mock.patch('sys.stdout', output):
+            message_writer = MessageWriter()
+            thread = threading.Thread(
+                target=lambda: [message_writer.write_record("tickets", {"id": i}) for i in range(10)])
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+            self.assertLessEqual(message_writer.queue.qsize(), 2)
+
+            output.release.set()
+            thread.join(5)
+            message_writer.flush()
+
+        self.assertEqual([m['record']['id'] for m in output.lines()], list(range(10)))
+
+    def test_each_thread_keeps_its_order(self):
+        output = BlockingOutput()
+        output.release.set()
+        message_writer = MessageWriter()
+
+        def write(stream):
+            message_writer.write_schema(stream, {"type": "object"}, ["id"])
+            for i in range(200):
+                message_writer.write_record(stream, {"id": i})
+            message_writer.write_state({stream: 199})
+
+        with mock.patch('sys.stdout', output):
+            threads = [threading.Thread(target=write, args=(stream,)) for stream in ("agents", "groups", "roles")]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            message_writer.flush()
+
+        messages = output.lines()
+        for stream in ("agents", "groups", "roles"):
+            own = [m for m in messages if m.get('stream') == stream or stream in m.get('value', {})]
+            self.assertEqual(own[0]['type'], 'SCHEMA')
+            self.assertEqual([m['record']['id'] for m in own[1:-1]], list(range(200)))
+            self.assertEqual(own[-1]['type'], 'STATE')
+
+    def test_values_orjson_cannot_encode_fall_back_to_singer(self):
+        line = format_message(singer.RecordMessage(stream="time_entries",
+                                                   record={"id": 1, "hours": decimal.Decimal("1.25")}))
+        self.assertEqual(json.loads(line)['record'], {"id": 1, "hours": 1.25})
+
+    def test_write_errors_surface_on_flush_and_later_writes(self):
+        message_writer = MessageWriter()
+        with mock.patch('sys.stdout', FailingOutput()):
+            message_writer.write_record("tickets", {"id": 1})
+            with self.assertRaisesRegex(OSError, "Broken pipe"):
+                message_writer.flush()
+            with self.assertRaisesRegex(OSError, "Broken pipe"):
+                message_writer.write_record("tickets", {"id": 2})